@@ -0,0 +1,468 @@
+"""Benchmarks for the scraper and report pipeline.
+
+    python benchmark.py profiles --pages 5
+    python benchmark.py scrape --rows 1000 --pages 10 --latency 0.2
+    python benchmark.py scrape --backends browser capture --verbose
+    python benchmark.py scrape --rows 2000 --latency 0.2 --page-sizes 500 --page-modes max portal
+    python benchmark.py handoff --rows 500 50000
+    python benchmark.py realign --rows 10000 1000000
+    python benchmark.py grouping --rows 10000 100000 1000000
+    python benchmark.py tagging --rows 10000 100000 1000000
+
+scrape runs against the synthetic mock portal, so it needs no credentials or network.
+Each benchmark prints a small table; add --json to get machine-readable results.
+"""
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+
+def bench_profiles(args):
+    """Per-page load time of the full and lean Chrome profiles against the configured portal"""
+    from webscraper import (load_config, load_settings, setup_driver, login_to_website,
+                            click_red_car_icon, go_to_next_page)
+    from waits import PaginationError
+
+    config = load_config()
+    url = args.url or config['credentials']['url']
+    username = config['credentials']['username']
+    password = config['credentials']['password']
+    settings = load_settings(config)
+
+    results = []
+    for profile in args.profiles:
+        start = time.perf_counter()
+        driver = setup_driver(profile)
+        startup = time.perf_counter() - start
+        try:
+            start = time.perf_counter()
+            if not (login_to_website(driver, url, username, password, settings["page_timeout"])
+                    and click_red_car_icon(driver, settings["page_timeout"],
+                                           settings["poll_interval"])):
+                print(f"Could not reach the grid with the {profile} profile")
+                continue
+            to_grid = time.perf_counter() - start
+
+            page_times = []
+            for _ in range(args.pages):
+                start = time.perf_counter()
+                try:
+                    if not go_to_next_page(driver, settings["page_timeout"], settings["poll_interval"]):
+                        break
+                except PaginationError as e:
+                    print(f"Stopped the {profile} profile early: {e}")
+                    break
+                page_times.append(time.perf_counter() - start)
+        finally:
+            driver.quit()
+
+        results.append({
+            "profile": profile,
+            "startup_seconds": startup,
+            "login_to_grid_seconds": to_grid,
+            "pages": len(page_times),
+            "mean_page_seconds": statistics.mean(page_times) if page_times else None,
+            "median_page_seconds": statistics.median(page_times) if page_times else None,
+        })
+    return results
+
+# Page-change waits compared by the scrape benchmark. "fixed" is the two-second sleep
+# after every click the scraper used before the event-driven waits.
+WAIT_STRATEGIES = {
+    "event": {"poll_interval": 0.1},
+    "event_coarse": {"poll_interval": 0.5},
+    "fixed": {"fixed_sleep": 2.0},
+}
+
+@contextlib.contextmanager
+def fixed_sleep_waits(seconds):
+    """Replace the scraper's page-change wait with a plain sleep for the duration"""
+    import webscraper
+    from waits import capture_page_state
+
+    def sleep_then_capture(driver, before, timeout=None, poll=None):
+        time.sleep(seconds)
+        return capture_page_state(driver)
+
+    original = webscraper.wait_for_page_change
+    webscraper.wait_for_page_change = sleep_then_capture
+    try:
+        yield
+    finally:
+        webscraper.wait_for_page_change = original
+
+def run_backend(backend, url, settings):
+    """Scrape the portal at url with one backend, returning all_data"""
+    if backend == "http":
+        from httpscraper import scrape_portal_http
+        return scrape_portal_http(url, "benchmark", "benchmark", settings["page_timeout"],
+                                  max_page_size=settings["max_page_size"])
+    if backend == "capture":
+        # Browser backend reading pages from the captured postback responses
+        from webscraper import scrape_with_browser
+        return scrape_with_browser(url, "benchmark", "benchmark", dict(settings, capture=True))
+    if backend == "parallel":
+        from parallel import scrape_pages_parallel
+        return scrape_pages_parallel(url, "benchmark", "benchmark", settings)
+    from webscraper import scrape_with_browser
+    return scrape_with_browser(url, "benchmark", "benchmark", settings)
+
+def bench_scrape(args):
+    """Rows per second and end-to-end time of each backend and wait strategy on the mock portal"""
+    from mock_portal import SyntheticPortal, start_server
+    from webscraper import SETTINGS
+
+    portal = SyntheticPortal(args.rows, args.pages, args.latency, args.seed,
+                             page_sizes=args.page_sizes)
+    server, url = start_server(portal)
+    # Start from the defaults, never the live config.ini or its cached session
+    base_settings = {name: default for name, (_, default) in SETTINGS.items()}
+    base_settings.update(profile=args.profile, headless="", session_cache=False,
+                         parallel_sessions=args.sessions)
+
+    results = []
+    try:
+        combinations = [(backend, strategy, mode) for backend in args.backends
+                        # The HTTP backend has no browser to wait on
+                        for strategy in (["n/a"] if backend == "http" else args.waits)
+                        for mode in args.page_modes]
+        for backend, strategy, mode in combinations:
+            settings = dict(base_settings)
+            settings.update(WAIT_STRATEGIES.get(strategy, {}))
+            # "max" switches to the largest page size the portal offers, "portal" keeps its own
+            settings["max_page_size"] = mode == "max"
+            fixed_sleep = settings.pop("fixed_sleep", None)
+
+            times = []
+            rows = 0
+            for _ in range(args.repeat):
+                waits = (fixed_sleep_waits(fixed_sleep) if fixed_sleep
+                         else contextlib.nullcontext())
+                output = contextlib.nullcontext() if args.verbose else \
+                    contextlib.redirect_stdout(io.StringIO())
+                start = time.perf_counter()
+                with waits, output:
+                    all_data = run_backend(backend, url, settings)
+                times.append(time.perf_counter() - start)
+                rows = max(len(all_data or []) - 1, 0)
+
+            seconds = statistics.median(times)
+            results.append({
+                "backend": backend,
+                "wait": strategy,
+                "page_size": mode,
+                "rows": rows,
+                "complete": rows == len(portal.rows),
+                "seconds": seconds,
+                "rows_per_second": rows / seconds if seconds else 0.0,
+            })
+    finally:
+        server.shutdown()
+    return results
+
+def bench_handoff(args):
+    """Write and read time of the xlsx export and its Arrow sidecar at each row count"""
+    import tempfile
+    from pathlib import Path
+
+    import pandas as pd
+
+    from mock_portal import GRID_HEADERS, synthetic_rows
+    from schema import EXPORT_SHEET, read_sidecar, typed_frame, write_sidecar
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for count in args.rows:
+            df = typed_frame(GRID_HEADERS, synthetic_rows(count, args.seed))
+            excel_path = Path(folder) / f"MART_Trips_{count}.xlsx"
+
+            start = time.perf_counter()
+            df.to_excel(excel_path, index=False, sheet_name=EXPORT_SHEET)
+            xlsx_write = time.perf_counter() - start
+            start = time.perf_counter()
+            sidecar = write_sidecar(df, excel_path)
+            sidecar_write = time.perf_counter() - start
+            if sidecar is None:
+                print("pyarrow is not installed, only the xlsx can be measured")
+
+            start = time.perf_counter()
+            pd.read_excel(excel_path)
+            xlsx_read = time.perf_counter() - start
+            sidecar_read = None
+            if sidecar:
+                start = time.perf_counter()
+                read_sidecar(sidecar)
+                sidecar_read = time.perf_counter() - start
+
+            results.append({
+                "rows": count,
+                "xlsx_write_seconds": xlsx_write,
+                "sidecar_write_seconds": sidecar_write if sidecar else None,
+                "xlsx_read_seconds": xlsx_read,
+                "sidecar_read_seconds": sidecar_read,
+                "read_speedup": xlsx_read / sidecar_read if sidecar_read else None,
+                "xlsx_kb": excel_path.stat().st_size // 1024,
+                "sidecar_kb": sidecar.stat().st_size // 1024 if sidecar else None,
+            })
+    return results
+
+def legacy_export_rows(count, seed=0):
+    """Synthetic rows the way old exports wrote them, with blank Trip Accepted and Phone dropped"""
+    from mock_portal import GRID_HEADERS, synthetic_rows
+
+    rows = []
+    for row in synthetic_rows(count, seed):
+        # Trip Accepted (0) and Phone (3) are the blanks realign_columns puts back
+        kept = [value for index, value in enumerate(row) if value or index not in (0, 3)]
+        rows.append(kept + [None] * (len(GRID_HEADERS) - len(kept)))
+    return rows
+
+def realign_rowwise(df):
+    """The iterrows realignment cleanup used before the rule engine, kept as the baseline"""
+    import re
+    import pandas as pd
+
+    fixed_rows = []
+    for _, row in df.iterrows():
+        row_data = row.tolist()
+        fixed_rows.append([None] + row_data[:-1] if row_data[0] in ["DAR", "Taxi"] else row_data)
+    df = pd.DataFrame(fixed_rows, columns=df.columns)
+
+    fixed_rows = []
+    for _, row in df.iterrows():
+        row_data = row.tolist()
+        if re.match(r'\d{1,2}/\d{1,2}/\d{4}', str(row_data[3])):
+            fixed_rows.append(row_data[:3] + [None] + row_data[3:-1])
+        else:
+            fixed_rows.append(row_data)
+    return pd.DataFrame(fixed_rows, columns=df.columns)
+
+def bench_realign(args):
+    """Row-loop vs rule-engine realignment of an old-style export at each row count"""
+    import pandas as pd
+
+    from cleanup import realign_columns
+    from mock_portal import GRID_HEADERS
+
+    results = []
+    for count in args.rows:
+        df = pd.DataFrame(legacy_export_rows(count, args.seed), columns=GRID_HEADERS)
+
+        start = time.perf_counter()
+        engine = realign_columns(df)
+        engine_seconds = time.perf_counter() - start
+
+        loop_seconds = None
+        if count <= args.loop_limit:
+            start = time.perf_counter()
+            baseline = realign_rowwise(df)
+            loop_seconds = time.perf_counter() - start
+            if not baseline.equals(engine):
+                print(f"Rule engine and row loop disagree at {count} rows")
+
+        results.append({
+            "rows": count,
+            "loop_seconds": loop_seconds,
+            "engine_seconds": engine_seconds,
+            "loop_rows_per_second": count / loop_seconds if loop_seconds else None,
+            "engine_rows_per_second": count / engine_seconds if engine_seconds else None,
+            "speedup": loop_seconds / engine_seconds if loop_seconds and engine_seconds else None,
+        })
+    return results
+
+def rider_frame(count, seed=0):
+    """A report table with about two trips per rider and random pick-up times"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    riders = rng.integers(0, max(count // 2, 1), count)
+    minutes = rng.integers(5 * 60, 15 * 60, count) // 15 * 15
+    times = pd.to_datetime(minutes, unit="m").strftime("%I:%M %p")
+    return pd.DataFrame({"Name": pd.Series(riders).map("RIDER {}".format),
+                         "Phone": pd.Series(riders).map("978-555-{:04d}".format),
+                         "P/U Time": times})
+
+def group_rowwise(df):
+    """The list-based grouping cleanup used before factorize, kept as the baseline"""
+    unique_names = []
+    group_numbers = []
+    for name in df["Name"]:
+        if name not in unique_names:
+            unique_names.append(name)
+            group_numbers.append(len(unique_names))
+        else:
+            group_numbers.append("")
+    df.insert(0, "Group", group_numbers)
+    return df
+
+def bench_grouping(args):
+    """List-scan grouping vs the factorize grouping stage (with and without clustering)"""
+    from cleanup import label_groups, number_riders, rider_keys
+
+    results = []
+    for count in args.rows:
+        df = rider_frame(count, args.seed)
+
+        loop_seconds = None
+        if count <= args.loop_limit:
+            start = time.perf_counter()
+            group_rowwise(df.copy())
+            loop_seconds = time.perf_counter() - start
+
+        timings = {}
+        for cluster in (False, True):
+            start = time.perf_counter()
+            label_groups(number_riders(df.copy(), rider_keys(df)), cluster)
+            timings[cluster] = time.perf_counter() - start
+
+        results.append({
+            "rows": count,
+            "loop_seconds": loop_seconds,
+            "hashed_seconds": timings[False],
+            "clustered_seconds": timings[True],
+            "hashed_ns_per_row": timings[False] / count * 1e9,
+            "clustered_ns_per_row": timings[True] / count * 1e9,
+        })
+    return results
+
+# Comments the tagging benchmark draws from, including the words the old "MT" check misread
+TAGGING_COMMENTS = ["", "", "", "", "", "MONITOR REQUIRED", "MT to ride with client",
+                    "Wheelchair", "EMT will meet at door", "Appointment at 9, call first",
+                    "Monitored trip", "Mt. Wachusett entrance", "Uses walker"]
+
+def tag_rowwise(df):
+    """The iterrows monitor tagging cleanup used before the rule engine, kept as the baseline"""
+    for idx, row in df.iterrows():
+        comments = str(row["Comments"]).upper()
+        if "MONITOR" in comments or "MT" in comments:
+            df.at[idx, "Name"] = f"{row['Name']} *monitor"
+    return df
+
+def bench_tagging(args):
+    """Row-loop vs compiled-rule monitor tagging, and how many rows the word rules stop tagging"""
+    import numpy as np
+    import pandas as pd
+
+    from cleanup import tag_monitored_riders
+
+    results = []
+    for count in args.rows:
+        rng = np.random.default_rng(args.seed)
+        df = pd.DataFrame({
+            "Name": [f"RIDER {i}" for i in range(count)],
+            "Comments": np.array(TAGGING_COMMENTS, dtype=object)[
+                rng.integers(0, len(TAGGING_COMMENTS), count)],
+        })
+
+        start = time.perf_counter()
+        tagged = tag_monitored_riders(df.copy())
+        engine_seconds = time.perf_counter() - start
+
+        loop_seconds = None
+        changed = None
+        if count <= args.loop_limit:
+            start = time.perf_counter()
+            baseline = tag_rowwise(df.copy())
+            loop_seconds = time.perf_counter() - start
+            changed = int((baseline["Name"] != tagged["Name"]).sum())
+
+        results.append({
+            "rows": count,
+            "loop_seconds": loop_seconds,
+            "engine_seconds": engine_seconds,
+            "speedup": loop_seconds / engine_seconds if loop_seconds and engine_seconds else None,
+            "tagged": int(tagged["Name"].str.endswith("*monitor").sum()),
+            "no_longer_tagged": changed,
+        })
+    return results
+
+BENCHMARKS = {
+    "profiles": bench_profiles,
+    "scrape": bench_scrape,
+    "handoff": bench_handoff,
+    "realign": bench_realign,
+    "grouping": bench_grouping,
+    "tagging": bench_tagging,
+}
+
+def print_results(results):
+    """Print a list of result dicts as an aligned table"""
+    if not results:
+        print("No results")
+        return
+    columns = list(results[0])
+    cells = [[f"{row[c]:.4f}" if isinstance(row[c], float) else str(row[c]) for c in columns]
+             for row in results]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Scraper and report benchmarks")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    profiles = subparsers.add_parser("profiles", help=bench_profiles.__doc__)
+    profiles.add_argument("--pages", type=int, default=5, help="pages to click through per profile")
+    profiles.add_argument("--profiles", nargs="+", default=["full", "lean"])
+    profiles.add_argument("--url", help="portal URL (defaults to config.ini)")
+
+    scrape = subparsers.add_parser("scrape", help=bench_scrape.__doc__)
+    scrape.add_argument("--rows", type=int, default=500, help="rows on the mock portal")
+    scrape.add_argument("--pages", type=int, default=5, help="grid pages on the mock portal")
+    scrape.add_argument("--latency", type=float, default=0.0,
+                        help="seconds the mock portal adds to every page")
+    scrape.add_argument("--seed", type=int, default=0)
+    scrape.add_argument("--backends", nargs="+", default=["http", "browser"],
+                        choices=["http", "browser", "capture", "parallel"])
+    scrape.add_argument("--waits", nargs="+", default=["event", "fixed"],
+                        choices=list(WAIT_STRATEGIES))
+    scrape.add_argument("--page-sizes", type=int, nargs="+",
+                        help="give the mock grid a page-size dropdown with these sizes (and All)")
+    scrape.add_argument("--page-modes", nargs="+", default=["max"], choices=["max", "portal"],
+                        help="switch to the largest page size, or keep the portal's")
+    scrape.add_argument("--profile", default="lean", choices=["full", "lean"],
+                        help="Chrome profile for the browser backends")
+    scrape.add_argument("--sessions", type=int, default=3, help="sessions for the parallel backend")
+    scrape.add_argument("--repeat", type=int, default=3, help="runs per combination (median is reported)")
+    scrape.add_argument("--verbose", action="store_true", help="show the scrapers' own output")
+
+    handoff = subparsers.add_parser("handoff", help=bench_handoff.__doc__)
+    handoff.add_argument("--rows", type=int, nargs="+", default=[500, 50000],
+                         help="row counts to measure (a busy day and 100x that)")
+    handoff.add_argument("--seed", type=int, default=0)
+
+    realign = subparsers.add_parser("realign", help=bench_realign.__doc__)
+    realign.add_argument("--rows", type=int, nargs="+", default=[10000, 1000000],
+                         help="row counts to realign")
+    realign.add_argument("--loop-limit", type=int, default=1000000,
+                         help="skip the row-loop baseline above this many rows")
+    realign.add_argument("--seed", type=int, default=0)
+
+    grouping = subparsers.add_parser("grouping", help=bench_grouping.__doc__)
+    grouping.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000],
+                          help="row counts to group")
+    grouping.add_argument("--loop-limit", type=int, default=20000,
+                          help="skip the list-scan baseline (quadratic) above this many rows")
+    grouping.add_argument("--seed", type=int, default=0)
+
+    tagging = subparsers.add_parser("tagging", help=bench_tagging.__doc__)
+    tagging.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000],
+                         help="row counts to tag")
+    tagging.add_argument("--loop-limit", type=int, default=100000,
+                         help="skip the row-loop baseline above this many rows")
+    tagging.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    results = BENCHMARKS[args.benchmark](args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+if __name__ == "__main__":
+    main()
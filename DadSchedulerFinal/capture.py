@@ -0,0 +1,134 @@
+"""Read the trips grid out of the portal's own postback responses.
+
+With [scraper] capture = true, Chrome logs its network events and every page the
+scraper clicks to is taken from the HTML the portal sent back (fetched once through
+the DevTools Network domain) instead of being read out of the rendered DOM. The HTML
+is handed to a worker thread as soon as the page has rendered and parsed there with
+lxml, off the thread driving Chrome. scrape_table_data is only used to check the first
+page and for pages whose response could not be captured.
+"""
+import base64
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lxml import html as lxml_html
+from selenium.common.exceptions import WebDriverException
+
+from httpscraper import parse_grid_html, read_page_indicator
+
+GRID_MARKER = "grid_MainDataGrid"
+# Full postbacks arrive as documents; an UpdatePanel would send them as XHR
+CAPTURED_TYPES = {"Document", "XHR", "Fetch"}
+
+def enable_network_log(chrome_options):
+    """Have chromedriver log network events so responses can be looked up afterwards"""
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    chrome_options.add_experimental_option("perfLoggingPrefs",
+                                           {"enableNetwork": True, "enablePage": False})
+
+def parse_response(text):
+    """Parse a captured response into the grid, its page indicator and the parse time"""
+    start = time.perf_counter()
+    doc = lxml_html.fromstring(text)
+    headers, rows = parse_grid_html(doc)
+    return {
+        "headers": headers,
+        "rows": rows,
+        "page": read_page_indicator(doc),
+        "seconds": time.perf_counter() - start,
+    }
+
+class GridCapture:
+    """Captures the grid page responses of one driver and parses them on a worker thread"""
+    def __init__(self, driver):
+        self.driver = driver
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="grid-parse")
+        # requestId -> URL of HTML responses seen since the last capture
+        self.responses = {}
+        self.latest = None
+        self.pending = {}
+        self.parse_times = []
+        self.last_seconds = None
+        self.fallbacks = 0
+        driver.execute_cdp_cmd("Network.enable", {})
+        # Forget the login and menu traffic
+        self.read_events()
+
+    def read_events(self):
+        """Drain chromedriver's network log, remembering the newest finished HTML response"""
+        for entry in self.driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            method, params = message.get("method"), message.get("params", {})
+            if method == "Network.responseReceived":
+                response = params.get("response", {})
+                if params.get("type") in CAPTURED_TYPES and "html" in response.get("mimeType", ""):
+                    self.responses[params["requestId"]] = response.get("url")
+            elif method == "Network.loadingFinished" and params.get("requestId") in self.responses:
+                self.latest = params["requestId"]
+
+    def prefetch(self, page):
+        """Queue the newest response for parsing as page, returning False if there is none"""
+        try:
+            self.read_events()
+            if self.latest is None:
+                return False
+            body = self.driver.execute_cdp_cmd("Network.getResponseBody",
+                                               {"requestId": self.latest})
+        except WebDriverException as e:
+            print(f"Could not capture the page {page} response: {e}")
+            return False
+        finally:
+            self.responses.clear()
+            self.latest = None
+
+        text = body.get("body", "")
+        if body.get("base64Encoded"):
+            text = base64.b64decode(text).decode("utf-8", errors="replace")
+        if GRID_MARKER not in text:
+            return False
+        self.pending[page] = self.pool.submit(parse_response, text)
+        return True
+
+    def page_data(self, page):
+        """page's rows (headers first) from its captured response, or None to read the DOM"""
+        self.last_seconds = None
+        if page not in self.pending:
+            self.prefetch(page)
+        future = self.pending.pop(page, None)
+        if future is None:
+            self.fallbacks += 1
+            return None
+        try:
+            parsed = future.result()
+        except Exception as e:
+            print(f"Could not parse the page {page} response: {e}")
+            self.fallbacks += 1
+            return None
+
+        self.parse_times.append(parsed["seconds"])
+        self.last_seconds = parsed["seconds"]
+        # Single-page grids have no indicator; otherwise it must be the page we are on
+        if not parsed["headers"] or (parsed["page"] and parsed["page"][0] != page):
+            print(f"Captured response is not page {page}, reading the page instead")
+            self.fallbacks += 1
+            return None
+        print(f"Parsed {len(parsed['rows'])} rows from the page {page} response "
+              f"in {parsed['seconds']:.3f}s (capture)")
+        return [parsed["headers"]] + parsed["rows"]
+
+    def close(self):
+        """Stop the worker thread and print the per-page parse times"""
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.parse_times:
+            print(f"Parsed {len(self.parse_times)} captured pages, "
+                  f"mean {sum(self.parse_times) / len(self.parse_times):.3f}s per page, "
+                  f"{self.fallbacks} read from the page instead")
+
+def start_capture(driver):
+    """Start capturing grid responses, or return None when the driver has no network log"""
+    try:
+        return GridCapture(driver)
+    except WebDriverException as e:
+        print(f"Network capture unavailable, reading pages from the DOM: {e}")
+        return None
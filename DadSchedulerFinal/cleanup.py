@@ -1,6 +1,6 @@
 import os
+import numpy as np
 import pandas as pd
-import re
 from datetime import datetime, timedelta
 from docx import Document
 from docx.shared import Pt, Inches, RGBColor
@@ -10,6 +10,29 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml.ns import nsdecls
 from docx.oxml import parse_xml
 from pathlib import Path
+from metrics import metrics, span
+from realign import ShiftRule, matches, one_of, realign
+from schema import GRID_SCHEMA, read_export, typed_frame
+from tagging import KeywordRule, TagRules
+
+# Old exports dropped blank cells. DAR/Taxi trips have no Trip Accepted, so their row slid
+# left by one; a missing phone number left the Date in the Phone column.
+TRIP_ACCEPTED_RULE = ShiftRule("Trip Accepted", one_of("DAR", "Taxi"))
+PHONE_RULE = ShiftRule("Phone", matches(r'\d{1,2}/\d{1,2}/\d{4}'))
+REALIGN_RULES = [TRIP_ACCEPTED_RULE, PHONE_RULE]
+
+# Comment keywords that mean the rider travels with a monitor. MT has to be an upper-case
+# word of its own, so EMT, APPOINTMENT and "Mt. Wachusett" no longer tag the rider.
+MONITOR_RULES = TagRules([
+    KeywordRule("MONITOR", "*monitor", prefix=True),
+    KeywordRule("MT", "*monitor", case=True),
+])
+
+# Put each rider's trips next to each other, in pick-up order, under one group number.
+# Off by default: turning it on reorders the schedule from the portal's order to rider order
+CLUSTER_GROUPS = False
+# Only treat trips as the same rider when the phone numbers match too
+MATCH_PHONE = False
 
 def process_excel_report():
     # Get tomorrow's date in various formats
@@ -32,49 +55,63 @@ def process_excel_report():
     output_file = os.path.join(downloads_folder, f"Schedule_report_{tomorrow_date_str}.docx")
     
     print(f"Processing file: {input_file}")
+    metrics_file = metrics.start_run("cleanup")
     
     # Read the Excel file
-    df = pd.read_excel(input_file)
+    with span("read_excel") as fields:
+        df, aligned = read_export(input_file)
+        fields["rows"] = len(df)
+        fields["aligned"] = aligned
+    
+    df = transform_report(df, aligned)
     
+    # Build and save the Word document
+    with span("docx_build", rows=len(df)):
+        render_report(df, output_file, tomorrow_formatted)
+    
+    print(f"Report successfully generated and saved as: {output_file}")
+    print(f"Timings written to {metrics_file}")
+
+def transform_report(df, aligned, seen_names=None, finish=True):
+    """Turn an export into the report table: realigned, monitor-tagged and grouped
+    
+    seen_names carries the group numbers of earlier pages when the table is built page by
+    page. With finish=False every row keeps its group number and the rows stay in export
+    order, so label_groups can cluster the pages together once they are all in.
+    """
     # Step 1: Rename headers
-    headers = [
-        "Trip Accepted", "Vehicle Type", "Name", "Phone", "Date", 
-        "Trip Direction", "P/U Time", "Appt Time", "P/U Address/Entrance", 
-        "P/U City", "Drop Address/Entrance", "Drop City", "Miles", 
-        "Fare", "Trip Type", "StandingOrder Id", "One Way", "Comments"
-    ]
-    
-    # Check if the DataFrame has enough columns
-    if len(df.columns) < len(headers):
-        # If not, extend the DataFrame with empty columns
-        for i in range(len(df.columns), len(headers)):
-            df[f"Column{i}"] = ""
-    
-    # Rename the first len(headers) columns
-    df.columns = headers + list(df.columns[len(headers):])
-    
-    # Step 2: Fix data alignment for rows with "DAR" or "Taxi" in Trip Accepted
-    fixed_rows = []
-    
-    for _, row in df.iterrows():
-        row_data = row.tolist()
-        if row_data[0] in ["DAR", "Taxi"]:
-            # Insert blank cell at beginning and shift right
-            fixed_rows.append([None] + row_data[:-1])
-        else:
-            fixed_rows.append(row_data)
-    
-    # Create new dataframe with fixed alignment
-    df = pd.DataFrame(fixed_rows, columns=df.columns)
-    
-    # Step 2.5: Fix phone column misalignment
-    df = fix_phone_column_misalignment(df)
+    headers = list(GRID_SCHEMA)
+    
+    if aligned:
+        # The scraper kept every cell under its own header, so only add missing columns
+        for column in headers:
+            if column not in df.columns:
+                df[column] = None
+    else:
+        # Check if the DataFrame has enough columns
+        if len(df.columns) < len(headers):
+            # If not, extend the DataFrame with empty columns
+            for i in range(len(df.columns), len(headers)):
+                df[f"Column{i}"] = ""
+        
+        # Rename the first len(headers) columns
+        df.columns = headers + list(df.columns[len(headers):])
+        
+        # Step 2: Fix data alignment for DAR/Taxi rows and misplaced phone cells
+        # (older exports dropped blank cells, shifting the rest of the row left)
+        with span("realignment") as fields:
+            shifted = {}
+            df = realign_columns(df, shifted)
+            fields["shifted"] = shifted
+    
+    # Riders are matched on who they are, before the name gets its *monitor tag
+    riders = rider_keys(df, MATCH_PHONE)
     
     # Step 3: Add monitoring indicator to names based on comments
-    for idx, row in df.iterrows():
-        comments = str(row["Comments"]).upper()  # Convert to string and uppercase for case-insensitive comparison
-        if "MONITOR" in comments or "MT" in comments:
-            df.at[idx, "Name"] = f"{row['Name']} *monitor"
+    with span("monitor_tagging") as fields:
+        tagged = {}
+        df = tag_monitored_riders(df, tagged)
+        fields["tagged"] = tagged.get("Name", 0)
     
     # Step 4: Delete specified columns
     columns_to_keep = ["Name", "Phone", "P/U Time", "Appt Time", "P/U Address/Entrance", 
@@ -82,20 +119,102 @@ def process_excel_report():
     df = df[columns_to_keep]
     
     # Step 5: Group identical names together and create group numbers
-    unique_names = []
-    group_numbers = []
-    
-    for name in df["Name"]:
-        if name not in unique_names:
-            unique_names.append(name)
-            group_numbers.append(len(unique_names))
-        else:
-            # Add an empty string for repeated names
-            group_numbers.append("")
-    
-    # Insert group numbers as the first column
-    df.insert(0, "Group", group_numbers)
+    with span("grouping", rows=len(df)):
+        df = number_riders(df, riders, seen_names)
+        if finish:
+            df = label_groups(df, CLUSTER_GROUPS)
+    return df
+
+class ReportBuilder:
+    """Builds the report table one scraped page at a time"""
+    def __init__(self):
+        # Running name index, so a rider seen on an earlier page is not numbered again
+        self.seen_names = {}
+        self.tables = []
+        self.rows = 0
+    
+    def add_page(self, headers, rows):
+        """Transform one page of position-aligned grid rows and keep the result"""
+        if not rows:
+            return
+        table = transform_report(typed_frame(headers, rows), True, self.seen_names, finish=False)
+        self.tables.append(table)
+        self.rows += len(table)
+    
+    def table(self):
+        """The report table for every page added so far"""
+        if not self.tables:
+            return None
+        with span("grouping", rows=self.rows):
+            return label_groups(pd.concat(self.tables, ignore_index=True), CLUSTER_GROUPS)
+
+def realign_columns(df, counts=None):
+    """Shift DAR/Taxi rows and rows with a date in the Phone column back into place
     
+    The DAR/Taxi shift runs first, so the Phone check sees the shifted rows.
+    """
+    return realign(df, REALIGN_RULES, counts)
+
+def tag_monitored_riders(df, counts=None):
+    """Append *monitor to the Name of riders whose comments ask for a monitor"""
+    return MONITOR_RULES.apply(df, counts)
+
+def rider_keys(df, match_phone=False):
+    """A key per row identifying the rider: the name in upper case with spacing normalized
+    
+    With match_phone the phone number's digits are part of the key as well.
+    """
+    keys = (df["Name"].fillna("").astype(str).str.upper()
+            .str.replace(r"\s*,\s*", ", ", regex=True)
+            .str.replace(r"\s+", " ", regex=True).str.strip())
+    if match_phone:
+        digits = df["Phone"].fillna("").astype(str).str.replace(r"\D", "", regex=True)
+        keys = keys + "|" + digits
+    return keys.reset_index(drop=True)
+
+def number_riders(df, riders, seen_names=None):
+    """Insert a Group column holding every row's rider number, in order of first appearance
+    
+    seen_names maps rider keys numbered on earlier pages to their number and is updated.
+    """
+    seen_names = {} if seen_names is None else seen_names
+    # Hash each key once; only the distinct riders go through the Python dict
+    codes, uniques = pd.factorize(riders)
+    numbers = np.empty(len(uniques), dtype=np.int64)
+    for code, key in enumerate(uniques):
+        numbers[code] = seen_names.setdefault(key, len(seen_names) + 1)
+    
+    df = df.reset_index(drop=True)
+    df.insert(0, "Group", numbers[codes])
+    return df
+
+def pickup_minutes(times):
+    """Minutes after midnight of each P/U Time ("08:30 AM"), unreadable times sorting last"""
+    parsed = pd.to_datetime(times.astype(str).str.strip(), format="%I:%M %p", errors="coerce")
+    minutes = parsed.dt.hour * 60 + parsed.dt.minute
+    return minutes.fillna(24 * 60).to_numpy(dtype=np.int64)
+
+def label_groups(df, cluster=False):
+    """Show each group number on its rider's first trip only, optionally clustering the trips
+    
+    cluster moves every rider's trips together, ordered by P/U Time, with the riders in
+    the order they first appear.
+    """
+    groups = df["Group"].to_numpy(dtype=np.int64)
+    if cluster:
+        # One integer sort key: rider number, then pick-up minute
+        order = np.argsort(groups * (24 * 60 + 1) + pickup_minutes(df["P/U Time"]), kind="stable")
+        df = df.iloc[order].reset_index(drop=True)
+        groups = groups[order]
+    
+    # Repeated riders get an empty string, like the report always had
+    labels = pd.Series(groups, dtype=object)
+    labels[pd.Series(groups).duplicated()] = ""
+    df["Group"] = labels.to_numpy()
+    return df
+
+def render_report(df, output_file, report_date):
+    """Write the schedule table to a landscape Word document"""
     # Create Word document
     doc = Document()
     
@@ -109,7 +228,7 @@ def process_excel_report():
     intro.alignment = WD_ALIGN_PARAGRAPH.CENTER
     
     # Add title
-    title_run = intro.add_run(f"RELIAMED {tomorrow_formatted}, FINAL SCHEDULED TRIPS\n")
+    title_run = intro.add_run(f"RELIAMED {report_date}, FINAL SCHEDULED TRIPS\n")
     title_run.bold = True
     title_run.font.size = Pt(14)
     
@@ -163,27 +282,10 @@ def process_excel_report():
     
     # Save document
     doc.save(output_file)
-    
-    print(f"Report successfully generated and saved as: {output_file}")
 
 def fix_phone_column_misalignment(df):
-    # Create a copy of the DataFrame to avoid modifying the original during iteration
-    fixed_rows = []
-    
-    for _, row in df.iterrows():
-        row_data = row.tolist()
-        phone_value = str(row_data[3])  # Phone column is at index 3
-        
-        # Check if the phone value matches a date pattern (MM/DD/YYYY or similar)
-        if re.match(r'\d{1,2}/\d{1,2}/\d{4}', phone_value):
-            # Insert empty cell at phone position and shift right
-            fixed_row = row_data[:3] + [None] + row_data[3:-1]
-            fixed_rows.append(fixed_row)
-        else:
-            fixed_rows.append(row_data)
-    
-    # Create new dataframe with fixed alignment
-    return pd.DataFrame(fixed_rows, columns=df.columns)
+    """Insert a blank Phone cell in rows whose Phone column holds a date (MM/DD/YYYY or similar)"""
+    return realign(df, [PHONE_RULE])
 
 if __name__ == "__main__":
     process_excel_report()
\ No newline at end of file
@@ -0,0 +1,229 @@
+"""Resident scraper service that keeps warmed, logged-in Chrome drivers alive.
+
+Start it once (for example from a logon task):
+
+    python daemon.py serve --drivers 1
+
+then run scrapes against it from the scheduled task:
+
+    python daemon.py scrape
+
+The client only imports the standard library, so it starts in a fraction of
+the time the cold webscraper.py takes to import selenium and pandas and
+launch Chrome. It exits non-zero when the scrape fails, like webscraper.py.
+"""
+import argparse
+import json
+import socket
+import sys
+import time
+
+DEFAULT_PORT = 8766
+# Recycle a driver after this many jobs or when Chrome grows past this much memory
+MAX_JOBS_PER_DRIVER = 25
+MAX_DRIVER_MEMORY_MB = 1500
+
+def send_request(request, port=DEFAULT_PORT, timeout=3600):
+    """Send one JSON request to the service and return its JSON reply"""
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout) as conn:
+        conn.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        reply = conn.makefile("r", encoding="utf-8").readline()
+    return json.loads(reply)
+
+def have_psutil():
+    """Whether psutil, which the memory recycle check needs, is installed"""
+    try:
+        import psutil
+    except ImportError:
+        return False
+    return True
+
+def driver_memory_mb(driver):
+    """Total resident memory of chromedriver and its Chrome children, or None if unreadable"""
+    import psutil
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        processes = [process] + process.children(recursive=True)
+        return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+    except (psutil.Error, AttributeError):
+        return None
+
+def serve(port, drivers, max_jobs, max_memory_mb):
+    """Run the scrape service until a stop request arrives"""
+    import queue
+    import socketserver
+    import threading
+
+    from locators import registry
+    from session_cache import is_logged_in
+    from webscraper import (load_config, load_settings, setup_driver, driver_options, log_in,
+                            click_red_car_icon, open_trips_grid, scrape_all_pages,
+                            save_data_to_excel, get_output_path)
+
+    config = load_config()
+    url = config['credentials']['url']
+    username = config['credentials']['username']
+    password = config['credentials']['password']
+    settings = load_settings(config)
+
+    def warm_driver():
+        """Start Chrome and log it in, timing the cold start a one-shot run pays"""
+        start = time.perf_counter()
+        driver = setup_driver(*driver_options(settings), capture=settings["capture"])
+        if not log_in(driver, url, username, password, settings):
+            driver.quit()
+            raise RuntimeError("Login failed while warming a driver")
+        cold_start = time.perf_counter() - start
+        print(f"Warmed a driver in {cold_start:.2f}s")
+        return {"driver": driver, "jobs": 0, "cold_start_seconds": cold_start,
+                "landing_url": driver.current_url}
+
+    def on_landing_page(driver):
+        """Whether the driver shows the logged-in page with the red car icon, without waiting"""
+        return (registry.first_match(driver, "red_car", lambda element: element) is not None
+                and is_logged_in(driver, 0))
+
+    def ensure_logged_in(slot):
+        """Return to the landing page, logging in again only if the portal dropped us
+
+        url is the login form, which never shows a logged-in page, so go back to the page
+        the login landed on instead.
+        """
+        driver = slot["driver"]
+        if on_landing_page(driver):
+            return True
+        if slot["landing_url"] and slot["landing_url"] != url:
+            driver.get(slot["landing_url"])
+            if on_landing_page(driver):
+                return True
+        print("Session dropped, logging in again")
+        if not log_in(driver, url, username, password, settings):
+            return False
+        slot["landing_url"] = driver.current_url
+        return True
+
+    def recycle(slot):
+        """Replace a driver in the background so the next job does not wait for it"""
+        def replace():
+            try:
+                slot["driver"].quit()
+            except Exception:
+                pass
+            while True:
+                try:
+                    pool.put(warm_driver())
+                    return
+                except Exception as e:
+                    print(f"Could not warm a replacement driver: {e}")
+                    time.sleep(30)
+        threading.Thread(target=replace, daemon=True).start()
+
+    def run_job(request):
+        slot = pool.get()
+        start = time.perf_counter()
+        try:
+            driver = slot["driver"]
+            if not ensure_logged_in(slot):
+                raise RuntimeError("Login failed")
+            if not click_red_car_icon(driver, settings["page_timeout"], settings["poll_interval"],
+                                      settings["tab"], settings["max_page_size"]):
+                raise RuntimeError("Failed to access data through red car icon")
+
+            all_data = scrape_all_pages(
+                driver, settings,
+                reopen=lambda d: open_trips_grid(d, url, username, password,
+                                                 settings["page_timeout"], settings["poll_interval"],
+                                                 settings["tab"], settings["max_page_size"]))
+            excel_path = request.get("output") or get_output_path()
+            if not save_data_to_excel(all_data, excel_path):
+                raise RuntimeError("No data to save")
+            latency = time.perf_counter() - start
+            reply = {
+                "ok": True,
+                "rows": len(all_data) - 1,
+                "excel_path": excel_path,
+                "latency_seconds": latency,
+                "cold_latency_seconds": latency + slot["cold_start_seconds"],
+            }
+        except Exception as e:
+            reply = {"ok": False, "error": str(e), "latency_seconds": time.perf_counter() - start}
+            # A failed job may leave the driver in a bad state
+            slot["jobs"] = max_jobs
+
+        slot["jobs"] += 1
+        memory = driver_memory_mb(slot["driver"]) if max_memory_mb else None
+        if slot["jobs"] >= max_jobs or (memory is not None and memory > max_memory_mb):
+            print(f"Recycling driver after {slot['jobs']} jobs ({memory or 0:.0f} MB)")
+            recycle(slot)
+        else:
+            pool.put(slot)
+        return reply
+
+    class JobHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+            command = request.get("command")
+            if command == "scrape":
+                reply = run_job(request)
+                print(f"Job finished: {reply}")
+            elif command == "status":
+                reply = {"ok": True, "idle_drivers": pool.qsize(), "drivers": drivers}
+            elif command == "stop":
+                reply = {"ok": True}
+                threading.Thread(target=server.shutdown, daemon=True).start()
+            else:
+                reply = {"ok": False, "error": f"Unknown command {command!r}"}
+            self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+    pool = queue.Queue()
+    for _ in range(drivers):
+        pool.put(warm_driver())
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", port), JobHandler)
+    print(f"Scraper service listening on 127.0.0.1:{port} with {drivers} warm driver(s)")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        while not pool.empty():
+            pool.get()["driver"].quit()
+        print("Scraper service stopped")
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident scraper service with warm browsers")
+    parser.add_argument("command", choices=["serve", "scrape", "status", "stop"])
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--drivers", type=int, default=1, help="warm drivers to keep (serve)")
+    parser.add_argument("--max-jobs", type=int, default=MAX_JOBS_PER_DRIVER)
+    parser.add_argument("--max-memory-mb", type=float, default=MAX_DRIVER_MEMORY_MB,
+                        help="recycle a driver past this much memory, 0 to never (needs psutil)")
+    parser.add_argument("--output", help="Excel path for this scrape (scrape)")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        if args.max_memory_mb and not have_psutil():
+            print("psutil is needed to recycle drivers by memory: pip install psutil, "
+                  "or pass --max-memory-mb 0")
+            return 2
+        serve(args.port, args.drivers, args.max_jobs, args.max_memory_mb)
+        return 0
+
+    start = time.perf_counter()
+    try:
+        reply = send_request({"command": args.command, "output": args.output}, args.port)
+    except OSError as e:
+        print(f"Could not reach the scraper service on port {args.port}: {e}")
+        return 2
+
+    if args.command == "scrape" and reply.get("ok"):
+        print(f"Scraped {reply['rows']} rows into {reply['excel_path']}")
+        print(f"Job latency {reply['latency_seconds']:.2f}s warm, "
+              f"{reply['cold_latency_seconds']:.2f}s with a cold start "
+              f"(client round trip {time.perf_counter() - start:.2f}s)")
+    else:
+        print(reply)
+    return 0 if reply.get("ok") else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
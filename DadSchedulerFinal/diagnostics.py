@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+DIAGNOSTICS_DIR = Path(__file__).parent / 'diagnostics'
+RING_SIZE = 20
+
+# Grabs the URL and the grid markup in one call; the grid is what we need to debug a page
+SNAPSHOT_SCRIPT = """
+var grid = document.getElementById('grid_MainDataGrid');
+return [window.location.href, grid ? grid.outerHTML : null];
+"""
+
+class Diagnostics:
+    """Ring buffer of cheap per-step artifacts, written to disk only when a step fails
+
+    Every step keeps its URL, grid HTML and timing in memory. When a step fails (or on
+    every step with debug on) the buffer and a screenshot go into a folder for this run,
+    so failures on different pages no longer overwrite each other.
+    """
+    def __init__(self, root=DIAGNOSTICS_DIR, capacity=RING_SIZE, debug=False):
+        self.root = Path(root)
+        self.debug = debug
+        self.steps = deque(maxlen=capacity)
+        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def configure(self, root=None, capacity=None, debug=None):
+        if root:
+            self.root = Path(root)
+        if capacity:
+            self.steps = deque(self.steps, maxlen=capacity)
+        if debug is not None:
+            self.debug = debug
+
+    @property
+    def run_dir(self):
+        return self.root / f"run_{self.run_id}"
+
+    def snapshot(self, driver):
+        """URL and grid HTML of the current page, without failing the caller"""
+        try:
+            url, grid_html = driver.execute_script(SNAPSHOT_SCRIPT)
+            return url, grid_html
+        except Exception as e:
+            return None, f"<!-- snapshot failed: {e} -->"
+
+    def record(self, step, driver, seconds, ok=True, error=None):
+        """Keep a step's artifacts in the ring buffer; dump them if it failed or debug is on"""
+        url, grid_html = self.snapshot(driver)
+        with self.lock:
+            self.sequence += 1
+            entry = {
+                "sequence": self.sequence,
+                "step": step,
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "seconds": round(seconds, 3),
+                "ok": ok,
+                "error": str(error) if error else None,
+                "url": url,
+                "grid_html": grid_html,
+            }
+            self.steps.append(entry)
+        if not ok or self.debug:
+            self.dump(step, driver, entry)
+
+    def failure(self, step, driver, error, started=None):
+        """Record a failed step and write the buffer with a screenshot"""
+        seconds = time.perf_counter() - started if started else 0.0
+        self.record(step, driver, seconds, ok=False, error=error)
+
+    def dump(self, step, driver, entry):
+        """Write the ring buffer and a screenshot into this run's folder"""
+        safe_step = "".join(c if c.isalnum() else "_" for c in step)
+        folder = self.run_dir / f"{entry['sequence']:04d}_{safe_step}"
+        try:
+            folder.mkdir(parents=True, exist_ok=True)
+            with self.lock:
+                history = list(self.steps)
+            for item in history:
+                if item["grid_html"]:
+                    (folder / f"{item['sequence']:04d}_grid.html").write_text(
+                        item["grid_html"], encoding="utf-8")
+            summary = [{k: v for k, v in item.items() if k != "grid_html"} for item in history]
+            (folder / "steps.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+            driver.save_screenshot(str(folder / "screenshot.png"))
+            if not entry["ok"]:
+                print(f"Diagnostics for failed step '{step}' saved to {folder}")
+        except Exception as e:
+            print(f"Could not write diagnostics: {e}")
+
+# Shared diagnostics buffer used by the scraper modules
+diagnostics = Diagnostics()
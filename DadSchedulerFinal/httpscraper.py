@@ -0,0 +1,391 @@
+import re
+import time
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from lxml import html as lxml_html
+
+from metrics import span
+from waits import PAGE_RETRIES, BACKOFF_SECONDS, PaginationError, backoff_delay
+from webscraper import largest_page_size, merge_page_data, position_rows
+
+# Matches javascript:__doPostBack('target','argument') links and onclick handlers
+POSTBACK_PATTERN = re.compile(r"__doPostBack\(\s*'([^']*)'\s*,\s*'([^']*)'\s*\)")
+
+UPPERCASE = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+LOWERCASE = "abcdefghijklmnopqrstuvwxyz"
+
+# Same controls as the page_size and show_all locators of the browser path
+PAGE_SIZE_XPATHS = [
+    f"//select[contains(translate(@id, '{UPPERCASE}', '{LOWERCASE}'), 'pagesize') or "
+    f"contains(translate(@name, '{UPPERCASE}', '{LOWERCASE}'), 'pagesize')]",
+    "//select[option[normalize-space(.)='All' or normalize-space(.)='Show All']]",
+]
+SHOW_ALL_XPATH = ("//a[contains(@href, '__doPostBack') and (normalize-space(.)='All' or "
+                  "normalize-space(.)='Show All' or normalize-space(.)='View All')]")
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+
+class PortalPage:
+    """A fetched portal page: its final URL and parsed HTML document"""
+    def __init__(self, url, text):
+        self.url = url
+        self.text = text
+        self.doc = lxml_html.fromstring(text)
+
+def create_session(pool_size=4):
+    """Create a pooled HTTP session that keeps connections to the portal alive"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+def fetch(session, method, url, timeout, **kwargs):
+    """Send a request and wrap the response as a PortalPage"""
+    response = session.request(method, url, timeout=timeout, **kwargs)
+    response.raise_for_status()
+    return PortalPage(response.url, response.text)
+
+def form_fields(form):
+    """Collect the values a browser would post for a form, including __VIEWSTATE"""
+    fields = {}
+    for field in form.xpath(".//input[@name]"):
+        field_type = (field.get("type") or "text").lower()
+        if field_type in ("submit", "image", "button", "reset", "file"):
+            continue
+        if field_type in ("checkbox", "radio") and field.get("checked") is None:
+            continue
+        fields[field.get("name")] = field.get("value", "")
+    for select in form.xpath(".//select[@name]"):
+        selected = select.xpath(".//option[@selected]") or select.xpath(".//option")
+        if selected:
+            fields[select.get("name")] = selected[0].get("value", selected[0].text_content())
+    for textarea in form.xpath(".//textarea[@name]"):
+        fields[textarea.get("name")] = textarea.text or ""
+    return fields
+
+def page_form(page):
+    """Return the page's main form (ASP.NET pages have exactly one)"""
+    forms = page.doc.xpath("//form")
+    if not forms:
+        raise ValueError(f"No form found on {page.url}")
+    return forms[0]
+
+def submit_form(session, page, extra_fields, timeout):
+    """Post the page's form back to the server with some extra fields set"""
+    form = page_form(page)
+    fields = form_fields(form)
+    fields.update(extra_fields)
+    action = urljoin(page.url, form.get("action") or page.url)
+    return fetch(session, "POST", action, timeout, data=fields)
+
+def activate(session, page, element, timeout):
+    """Do what a browser does when the element is clicked"""
+    # Image buttons post their click coordinates
+    if element.tag == "input" and (element.get("type") or "").lower() == "image":
+        name = element.get("name")
+        return submit_form(session, page, {f"{name}.x": "1", f"{name}.y": "1"}, timeout)
+
+    # Submit buttons post their own name and value
+    if element.tag in ("input", "button") and (element.get("type") or "submit").lower() == "submit":
+        extra = {element.get("name"): element.get("value", "")} if element.get("name") else {}
+        return submit_form(session, page, extra, timeout)
+
+    # Otherwise walk up to the nearest link or postback handler
+    for node in [element] + list(element.iterancestors()):
+        handler = (node.get("href") or "") + " " + (node.get("onclick") or "")
+        postback = POSTBACK_PATTERN.search(handler)
+        if postback:
+            target, argument = postback.groups()
+            return submit_form(session, page,
+                               {"__EVENTTARGET": target, "__EVENTARGUMENT": argument}, timeout)
+        href = node.get("href")
+        if node.tag == "a" and href and not href.lower().startswith("javascript:"):
+            return fetch(session, "GET", urljoin(page.url, href), timeout)
+
+    raise ValueError(f"Don't know how to click <{element.tag}> on {page.url}")
+
+def find_first(page, xpaths, description):
+    """Return the first element matching any of the xpaths"""
+    for xpath in xpaths:
+        found = page.doc.xpath(xpath)
+        if found:
+            return found[0]
+    raise ValueError(f"Could not find {description} on {page.url}")
+
+def cell_text(cell):
+    """Return a cell's text the way the browser renders it (like Selenium's .text)"""
+    for br in cell.xpath(".//br"):
+        br.tail = "\n" + (br.tail or "")
+    lines = [" ".join(line.split()) for line in cell.text_content().split("\n")]
+    return "\n".join(line for line in lines if line).strip()
+
+def parse_grid_html(doc):
+    """Parse grid_MainDataGrid out of an HTML document into (headers, rows)"""
+    grids = doc.xpath("//*[@id='grid_MainDataGrid']")
+    if not grids:
+        return [], []
+    rows = grids[0].xpath("./tbody/tr | ./tr")
+    if not rows:
+        return [], []
+
+    headers = [cell_text(cell) for cell in rows[0].xpath(".//td")]
+    grid_rows = [[(cell.get("class"), cell_text(cell)) for cell in row.xpath(".//td")]
+                 for row in rows[1:]]
+    return headers, position_rows(len(headers), grid_rows)
+
+def read_page_indicator(doc):
+    """Read the "Page X of Y" text from a document, returning (current, total) or None"""
+    for element in doc.xpath("//*[contains(text(), 'Page')]"):
+        numbers = [int(n) for n in re.findall(r'\d+', element.text or "")]
+        if len(numbers) >= 2:
+            return numbers[0], numbers[1]
+    return None
+
+def login_http(session, url, username, password, timeout=30):
+    """Log in by posting the login form fields, returning the landing page"""
+    print(f"Opening website: {url}")
+    page = fetch(session, "GET", url, timeout)
+
+    username_field = find_first(page, [
+        "//input[@type='text' and contains(@name, 'UserName')]",
+        "//input[@name='UserName' and contains(@id, 'UserName')]",
+    ], "username field")
+    password_field = find_first(page, [
+        "//input[@name='Password']",
+        "//input[@type='password']",
+    ], "password field")
+    login_button = find_first(page, [
+        "//input[@type='submit']",
+        "//input[@name='Submit']",
+    ], "login button")
+
+    extra = {username_field.get("name"): username, password_field.get("name"): password}
+    if login_button.get("name"):
+        extra[login_button.get("name")] = login_button.get("value", "")
+    page = submit_form(session, page, extra, timeout)
+
+    # Only the logged-in pages have welcomeUser; the portal title cell is on the login form too
+    if not page.doc.xpath("//span[@id='welcomeUser']"):
+        raise ValueError("Could not verify successful login")
+
+    print("Successfully logged in")
+    return page
+
+def maximize_page_size_http(session, page, timeout=30):
+    """Post the grid's largest page size (or "show all"), returning the resized grid page
+
+    Without a page-size control, or when the postback does not come back with the grid,
+    the page is returned as it was.
+    """
+    selects = [found[0] for found in (page.doc.xpath(xpath) for xpath in PAGE_SIZE_XPATHS) if found]
+    try:
+        if selects:
+            select = selects[0]
+            value = largest_page_size([(option.get("value", option.text_content()), option.text_content())
+                                       for option in select.xpath(".//option")])
+            if value is None or form_fields(page_form(page)).get(select.get("name")) == value:
+                return page
+            # An auto-postback dropdown posts back as itself with the new value
+            name = select.get("name")
+            resized = submit_form(session, page, {name: value, "__EVENTTARGET": name,
+                                                  "__EVENTARGUMENT": ""}, timeout)
+        else:
+            show_all = page.doc.xpath(SHOW_ALL_XPATH)
+            if not show_all:
+                print("No page-size control on the grid, keeping its page size")
+                return page
+            resized = activate(session, page, show_all[0], timeout)
+    except (requests.RequestException, ValueError) as e:
+        print(f"Could not change the grid's page size, keeping it: {e}")
+        return page
+
+    if not resized.doc.xpath("//*[@id='grid_MainDataGrid']"):
+        print("Changing the page size lost the grid, keeping its page size")
+        return page
+    indicator = read_page_indicator(resized.doc)
+    pages = indicator[1] if indicator else 1
+    print(f"Switched the grid to its largest page size ({pages} {'page' if pages == 1 else 'pages'})")
+    return resized
+
+def open_trips_page(session, page, timeout=30, tab="", max_page_size=True):
+    """Follow the red car icon and the Trips tab (or the tab drawn with image tab) to the grid"""
+    red_car = find_first(page, ["//*[contains(@src, 'images/DownloadTrips.gif')]"], "red car icon")
+    page = activate(session, page, red_car, timeout)
+    print("Clicked on red car icon")
+
+    if tab:
+        # Tab image names come from config.ini, which lowercases them
+        other_tab = find_first(page, [f"//*[contains(translate(@src, '{UPPERCASE}', '{LOWERCASE}'), "
+                                      f"'{tab.lower()}')]"], f"{tab} tab")
+        page = activate(session, page, other_tab, timeout)
+        print(f"Clicked on {tab} tab")
+    elif not page.doc.xpath("//*[@id='grid_MainDataGrid']"):
+        trips_tab = find_first(page, ["//*[contains(@src, '/ITMSVP/images/tabTripsOnMART.gif')]"],
+                               "MH Trips tab")
+        page = activate(session, page, trips_tab, timeout)
+        print("Clicked on MH Trips tab")
+
+    if max_page_size:
+        page = maximize_page_size_http(session, page, timeout)
+    return page
+
+def check_grid_page(page, target, total):
+    """Raise ValueError unless page is page target of the grid and has rows
+
+    An expired session posts back the login page, which has neither the grid nor a page
+    indicator; retry_page_http then logs in again instead of taking it for the last page.
+    """
+    grids = page.doc.xpath("//*[@id='grid_MainDataGrid']")
+    if not grids:
+        raise ValueError(f"Page {target} of {total} came back without the grid")
+    indicator = read_page_indicator(page.doc)
+    if indicator is None:
+        raise ValueError(f"Page {target} of {total} came back without a page indicator")
+    if indicator[0] != target:
+        raise ValueError(f"Expected page {target} of {total}, got page {indicator[0]}")
+    if len(grids[0].xpath("./tbody/tr | ./tr")) < 2:
+        raise ValueError(f"Page {target} of {total} returned no data")
+
+def next_page(session, page, timeout=30):
+    """Post back the next-page arrow, returning the new page or None on the last page"""
+    indicator = read_page_indicator(page.doc)
+    if indicator is None or indicator[0] >= indicator[1]:
+        print("No more pages available")
+        return None
+
+    next_button = find_first(page, ["//*[contains(@src, 'arwSmallDownOn.gif')]"], "next page button")
+    new_page = activate(session, page, next_button, timeout)
+
+    check_grid_page(new_page, indicator[0] + 1, indicator[1])
+    print(f"Navigated to page {indicator[0] + 1} of {indicator[1]}")
+    return new_page
+
+def go_to_page_http(session, page, target, timeout=30):
+    """Move the grid forward to target, jumping there with a numbered pager link when there is one"""
+    while True:
+        indicator = read_page_indicator(page.doc)
+        if indicator is None:
+            # Single-page grids have no page indicator
+            if target == 1:
+                return page
+            raise ValueError(f"No page indicator, cannot reach page {target}")
+
+        current_page, total_pages = indicator
+        if current_page == target:
+            return page
+        if target < current_page or target > total_pages:
+            raise ValueError(f"Cannot move the grid from page {current_page} to page {target}")
+
+        page_links = page.doc.xpath(
+            f"//a[normalize-space(text())='{target}' and contains(@href, '__doPostBack')]")
+        if page_links:
+            page = activate(session, page, page_links[0], timeout)
+            check_grid_page(page, target, total_pages)
+            print(f"Jumped to page {target} of {total_pages}")
+        else:
+            page = next_page(session, page, timeout)
+            if page is None:
+                raise ValueError(f"Ran out of pages before page {target}")
+
+def reopen_http(session, url, username, password, target, timeout=30, tab="", max_page_size=True):
+    """Log in from scratch and go straight to page target of the grid"""
+    session.cookies.clear()
+    page = login_http(session, url, username, password, timeout)
+    page = open_trips_page(session, page, timeout, tab, max_page_size)
+    return go_to_page_http(session, page, target, timeout)
+
+def retry_page_http(action, target, reopen, retries=PAGE_RETRIES, backoff=BACKOFF_SECONDS,
+                    retried=None):
+    """Run action() with exponential backoff, falling back to reopen(target) after each failure
+
+    reopen logs in again and jumps straight to page target, which also covers an expired
+    session. Raises PaginationError once the retries are used up.
+    """
+    for attempt in range(1, retries + 2):
+        try:
+            return action()
+        except (requests.RequestException, ValueError) as e:
+            if attempt > retries:
+                raise PaginationError(f"page {target} failed after {attempt} attempts: {e}") from e
+            delay = backoff_delay(attempt, backoff)
+            print(f"Page {target} failed ({e}), retrying in {delay:.1f}s "
+                  f"(retry {attempt} of {retries})")
+            if retried is not None:
+                retried[target] = attempt
+            time.sleep(delay)
+            try:
+                print(f"Re-opening the grid at page {target}")
+                return reopen(target)
+            except (requests.RequestException, ValueError) as e:
+                print(f"Could not re-open the grid at page {target}: {e}")
+
+def scrape_portal_http(url, username, password, timeout=30, on_page=None, start_page=1,
+                       keep_data=True, retries=PAGE_RETRIES, backoff=BACKOFF_SECONDS, tab="",
+                       max_page_size=True):
+    """Scrape every grid page over plain HTTP, returning all_data like the browser path"""
+    session = create_session()
+    retried = {}
+
+    def reopen(target):
+        return reopen_http(session, url, username, password, target, timeout, tab, max_page_size)
+
+    try:
+        with span("login", backend="http"):
+            page = login_http(session, url, username, password, timeout)
+
+        with span("navigation", backend="http"):
+            page = open_trips_page(session, page, timeout, tab, max_page_size)
+
+            # Postbacks are cheap, so skip already-saved pages by jumping past them
+            page_count = start_page
+            if start_page > 1:
+                indicator = read_page_indicator(page.doc)
+                if indicator is None or start_page > indicator[1]:
+                    page = None
+                else:
+                    start = page
+                    page = retry_page_http(
+                        lambda: go_to_page_http(session, start, start_page, timeout),
+                        start_page, reopen, retries, backoff, retried)
+
+        all_data = []
+        # Pages fetched and time spent moving between them, so the page size's effect shows
+        with span("paging", start_page=start_page, pages=0, navigation_seconds=0.0,
+                  backend="http") as paging:
+            while page is not None:
+                print(f"Processing page {page_count}")
+                start = time.perf_counter()
+                with span("scrape_page", page=page_count, backend="http") as fields:
+                    headers, rows = parse_grid_html(page.doc)
+                    fields["rows"] = len(rows)
+                print(f"Scraped {len(rows)} rows of data in {time.perf_counter() - start:.2f}s (http)")
+                page_data = [headers] + rows if headers else rows
+                if not page_data:
+                    raise PaginationError(f"page {page_count} returned no data")
+                paging["pages"] += 1
+                if keep_data:
+                    merge_page_data(all_data, page_data)
+                if on_page and on_page(page_count, page_data) is False:
+                    break
+
+                started = time.perf_counter()
+                with span("pagination", page=page_count, backend="http") as fields:
+                    current = page
+                    page = retry_page_http(lambda: next_page(session, current, timeout),
+                                           page_count + 1, reopen, retries, backoff, retried)
+                    fields["retries"] = retried.get(page_count + 1, 0)
+                paging["navigation_seconds"] += time.perf_counter() - started
+                page_count += 1
+        print(f"Fetched {paging['pages']} pages, {paging['navigation_seconds']:.2f}s "
+              f"spent moving between them")
+        return all_data
+    finally:
+        if retried:
+            print("Pages that needed retries: " +
+                  ", ".join(f"{page} ({count}x)" for page, count in sorted(retried.items())))
+        session.close()
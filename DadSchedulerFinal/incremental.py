@@ -0,0 +1,138 @@
+import hashlib
+import json
+from pathlib import Path
+
+import pandas as pd
+
+# Columns that identify one trip across runs; the rest of the row is what can change
+KEY_COLUMNS = ["StandingOrder Id", "Date", "Trip Direction", "Name"]
+
+def hash_values(values):
+    """Stable hash of a list of cell values"""
+    # Blank cells are None when scraped and "" when read back from the page sink
+    text = "\x1f".join("" if v is None else str(v) for v in values)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def row_key(header, row):
+    """Identify a trip by its StandingOrder Id and key columns, or by the whole row without one"""
+    record = dict(zip(header, row))
+    if record.get("StandingOrder Id"):
+        return hash_values(record.get(column, "") for column in KEY_COLUMNS)
+    return hash_values(row)
+
+def fingerprint_rows(header, rows):
+    """Map each row's key to (row hash, row); repeated keys get a running suffix"""
+    fingerprints = {}
+    for row in rows:
+        key = row_key(header, row)
+        unique_key, count = key, 1
+        while unique_key in fingerprints:
+            count += 1
+            unique_key = f"{key}#{count}"
+        fingerprints[unique_key] = (hash_values(row), row)
+    return fingerprints
+
+def state_path(excel_path):
+    """The fingerprint file stored next to an export"""
+    return Path(excel_path).with_suffix(".state.json")
+
+def load_state(path):
+    """Read the previous run's fingerprints, or None on the first run"""
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+class IncrementalTracker:
+    """Fingerprints each page as it is scraped and spots where paging can stop early"""
+    def __init__(self, previous=None, stop_on_unchanged_page=False):
+        self.previous = previous
+        self.stop_on_unchanged_page = stop_on_unchanged_page
+        self.pages = []
+        self.stopped_early_at = None
+
+    def on_page(self, page_number, page_data):
+        """scrape_all_pages callback: record the page and return False to stop paging"""
+        rows = page_data[1:] if page_data else []
+        page_hash = hash_values(hash_values(row) for row in rows)
+        self.pages.append({"hash": page_hash, "rows": rows})
+
+        previous_pages = (self.previous or {}).get("pages") or []
+        if (self.stop_on_unchanged_page and page_number <= len(previous_pages)
+                and previous_pages[page_number - 1]["hash"] == page_hash):
+            # The grid is ordered so changes come first: nothing later has changed either
+            print(f"Page {page_number} is unchanged since the last run, stopping early")
+            self.stopped_early_at = page_number
+            return False
+        return True
+
+    def filter_rows(self, keep):
+        """Keep only the rows keep(row) accepts in the recorded pages
+
+        The page hashes stay those of the grid as scraped, so stop_on_unchanged_page still
+        compares whole grid pages while the stored rows match the filtered export.
+        """
+        for page in self.pages:
+            page["rows"] = [row for row in page["rows"] if keep(row)]
+
+    def fill_remaining_pages(self, all_data):
+        """After an early stop, take the later pages from the previous run"""
+        if self.stopped_early_at is None:
+            return all_data
+        for page in self.previous["pages"][self.stopped_early_at:]:
+            all_data.extend(page["rows"])
+            self.pages.append(page)
+        return all_data
+
+def save_state(path, all_data, pages=None):
+    """Store this run's page and row fingerprints for the next run"""
+    if pages is None:
+        # Backends without page boundaries store the export as a single page
+        rows = all_data[1:]
+        pages = [{"hash": hash_values(hash_values(row) for row in rows), "rows": rows}]
+    state = {"header": all_data[0] if all_data else [], "pages": pages}
+    Path(path).write_text(json.dumps(state), encoding="utf-8")
+
+def diff_runs(previous, all_data):
+    """Compare this run with the previous one, returning added, removed and changed rows"""
+    header = all_data[0] if all_data else []
+    current = fingerprint_rows(header, all_data[1:])
+    old_rows = [row for page in previous.get("pages", []) for row in page["rows"]]
+    old = fingerprint_rows(previous.get("header", header), old_rows)
+
+    added = [current[key][1] for key in current if key not in old]
+    removed = [old[key][1] for key in old if key not in current]
+    changed = [current[key][1] for key in current if key in old and old[key][0] != current[key][0]]
+    return {"added": added, "removed": removed, "changed": changed}
+
+def write_changes(changes, header, path):
+    """Write the delta as one sheet with a Change column in front"""
+    records = [[kind] + row for kind in ("added", "removed", "changed") for row in changes[kind]]
+    width = max([len(header)] + [len(record) - 1 for record in records])
+    columns = ["Change"] + [h or f"Column{i}" for i, h in enumerate(header)]
+    columns += [f"Column{i}" for i in range(len(header), width)]
+    df = pd.DataFrame([record + [None] * (width + 1 - len(record)) for record in records],
+                      columns=columns)
+    df.to_excel(path, index=False)
+    return path
+
+def record_changes(excel_path, all_data, tracker=None):
+    """Diff against the last run, write the delta file and store the new fingerprints"""
+    path = state_path(excel_path)
+    previous = tracker.previous if tracker else load_state(path)
+    # An earlier run's delta must not be acted on again
+    changes_path = Path(str(excel_path).replace(".xlsx", "_changes.xlsx"))
+    if changes_path.exists():
+        changes_path.unlink()
+
+    if previous:
+        changes = diff_runs(previous, all_data)
+        print(f"Changes since last run: {len(changes['added'])} added, "
+              f"{len(changes['removed'])} removed, {len(changes['changed'])} changed")
+        if any(changes.values()):
+            write_changes(changes, all_data[0] if all_data else [], changes_path)
+            print(f"Changes saved to {changes_path}")
+    else:
+        print("No previous run to compare with, storing fingerprints only")
+
+    save_state(path, all_data, tracker.pages if tracker else None)
@@ -0,0 +1,233 @@
+"""Run several scrape jobs (account x service date x tab) from one config.ini.
+
+    python jobs.py                      # every [job:<name>] section
+    python jobs.py --only north south   # just the named jobs
+
+Each job writes its own export and reports its own status. Jobs that read the same
+grid (same account, tab and settings) share one scrape and each keeps its own date's
+trips, so several dates for one account cost a single scrape. Scrapes run concurrently
+up to [jobs] max_concurrent, with at most per_account of them logged in under the same
+username at once, so the evening run takes about as long as its slowest scrape. A job
+ends ok, empty (nothing on the grid), no_date (trips on the grid, none on the job's
+date) or failed. Exit codes: 0 no job failed, 1 any job failed.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from metrics import metrics, span
+
+JOB_PREFIX = "job:"
+ACCOUNT_PREFIX = "account:"
+# account = credentials (the default) logs in with the [credentials] section
+DEFAULT_ACCOUNT = "credentials"
+DEFAULT_DATE = "tomorrow"
+MAX_CONCURRENT = 4
+PER_ACCOUNT = 1
+
+OUTPUT_FOLDER = os.path.join(os.path.expanduser("~"), "Downloads", "WebScrapedData")
+STATUS_FILE = "jobs_status.json"
+
+def parse_service_date(text, today=None):
+    """Turn today, tomorrow, +N or YYYY-MM-DD into a date"""
+    today = today or date.today()
+    text = text.strip().lower()
+    if text == "today":
+        return today
+    if text == "tomorrow":
+        return today + timedelta(days=1)
+    if text.startswith("+") and text[1:].isdigit():
+        return today + timedelta(days=int(text[1:]))
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"date must be today, tomorrow, +N or YYYY-MM-DD, not '{text}'")
+
+def load_account(config, name):
+    """The url, username and password of an [account:<name>] (or [credentials]) section"""
+    section = DEFAULT_ACCOUNT if name == DEFAULT_ACCOUNT else ACCOUNT_PREFIX + name
+    if not config.has_section(section):
+        raise ValueError(f"account '{name}' has no [{section}] section")
+    return {key: config[section][key] for key in ("url", "username", "password")}
+
+def load_jobs(config, only=None, today=None):
+    """Read the [job:<name>] sections into job dicts, in config order"""
+    from webscraper import load_settings
+
+    jobs = []
+    for section in config.sections():
+        if not section.startswith(JOB_PREFIX):
+            continue
+        name = section[len(JOB_PREFIX):]
+        if only and name not in only:
+            continue
+        options = config[section]
+        account = options.get("account", DEFAULT_ACCOUNT).strip()
+        service_date = parse_service_date(options.get("date", DEFAULT_DATE), today)
+        output = options.get("output", "").strip() or os.path.join(
+            OUTPUT_FOLDER, f"MART_Trips_{name}_{service_date.strftime('%Y%m%d')}.xlsx")
+        jobs.append({
+            "name": name,
+            "account": account,
+            "credentials": load_account(config, account),
+            "date": service_date,
+            # [scraper]/[driver]/... settings, with any the job section sets itself (tab, backend, ...)
+            "settings": load_settings(config, section),
+            "output": output,
+        })
+    if only:
+        missing = set(only) - {job["name"] for job in jobs}
+        if missing:
+            raise ValueError(f"no [job:<name>] section for {', '.join(sorted(missing))}")
+    return jobs
+
+def group_scrapes(jobs):
+    """Group the jobs that read the same grid (account, tab and settings), in config order
+
+    The grid lists every day the portal shows, so a group is scraped once and each of its
+    jobs keeps its own date's trips.
+    """
+    groups = {}
+    for job in jobs:
+        credentials = job["credentials"]
+        key = (credentials["url"], credentials["username"], credentials["password"],
+               tuple(sorted(job["settings"].items())))
+        groups.setdefault(key, []).append(job)
+    return list(groups.values())
+
+def interleave_accounts(groups):
+    """Order job groups round-robin over accounts so a busy account does not hold every pool worker"""
+    by_account = {}
+    for group in groups:
+        by_account.setdefault(group[0]["credentials"]["username"], []).append(group)
+    ordered = []
+    while by_account:
+        for username in list(by_account):
+            ordered.append(by_account[username].pop(0))
+            if not by_account[username]:
+                del by_account[username]
+    return ordered
+
+def job_status(job, df, stats):
+    """Fill in a job's status from its export DataFrame (None when it failed) and stats"""
+    status = {"job": job["name"], "account": job["account"], "date": job["date"].isoformat(),
+              "tab": job["settings"]["tab"] or "trips", "output": job["output"],
+              "status": "failed", "rows": 0, "seconds": 0.0, "error": None}
+    if df is None:
+        status["error"] = "scrape failed"
+    elif len(df):
+        status["rows"] = len(df)
+        status["status"] = "ok"
+    elif stats.get("scraped"):
+        # Not the same as nothing scheduled: the portal is not listing that day
+        status["status"] = "no_date"
+        status["error"] = f"{stats['scraped']} trips on the grid, none on {status['date']}"
+    else:
+        status["status"] = "empty"
+    return status
+
+def run_group(group, account_slots):
+    """Scrape one grid for a group of jobs under its account's concurrency limit
+
+    Returns a status dict per job; every job in the group reports the shared scrape's time.
+    """
+    from webscraper import scrape_exports
+
+    credentials = group[0]["credentials"]
+    names = ", ".join(job["name"] for job in group)
+    stats = [{} for _ in group]
+    results = None
+    error = None
+    with account_slots[credentials["username"]]:
+        print(f"[{names}] Starting ({group[0]['account']}, "
+              f"{', '.join(job['date'].isoformat() for job in group)}, "
+              f"tab {group[0]['settings']['tab'] or 'trips'})")
+        start = time.perf_counter()
+        try:
+            for job in group:
+                os.makedirs(os.path.dirname(os.path.abspath(job["output"])), exist_ok=True)
+            with span("job", job=names) as fields:
+                results = scrape_exports(credentials["url"], credentials["username"],
+                                         credentials["password"], group[0]["settings"],
+                                         [(job["output"], job["date"]) for job in group],
+                                         stats=stats)
+                fields["rows"] = sum(len(df) for df in results if df is not None) if results else None
+        except Exception as e:
+            error = str(e)
+        seconds = round(time.perf_counter() - start, 3)
+
+    statuses = []
+    for index, job in enumerate(group):
+        status = job_status(job, results[index] if results else None, stats[index])
+        status["seconds"] = seconds
+        if error:
+            status["error"] = error
+        print(f"[{job['name']}] {status['status']} - {status['rows']} rows in {seconds:.2f}s"
+              + (f" ({status['error']})" if status["error"] else ""))
+        statuses.append(status)
+    return statuses
+
+def run_jobs(jobs, max_concurrent=MAX_CONCURRENT, per_account=PER_ACCOUNT):
+    """Run every job concurrently within the limits, returning their statuses in job order"""
+    account_slots = {job["credentials"]["username"]: threading.BoundedSemaphore(per_account)
+                     for job in jobs}
+    groups = interleave_accounts(group_scrapes(jobs))
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrent, len(groups))),
+                            thread_name_prefix="job") as pool:
+        futures = [pool.submit(run_group, group, account_slots) for group in groups]
+    by_name = {status["job"]: status for future in futures for status in future.result()}
+    return [by_name[job["name"]] for job in jobs]
+
+def write_status(statuses, wall_seconds, folder=OUTPUT_FOLDER):
+    """Write this run's job statuses to jobs_status.json in the output folder"""
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, STATUS_FILE)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"finished": datetime.now().isoformat(timespec="seconds"),
+                   "wall_seconds": round(wall_seconds, 3), "jobs": statuses}, f, indent=2)
+    return path
+
+def main():
+    from webscraper import load_config
+    from diagnostics import diagnostics
+
+    parser = argparse.ArgumentParser(description="Run the [job:<name>] scrape jobs in config.ini")
+    parser.add_argument("--only", nargs="+", help="names of the jobs to run")
+    args = parser.parse_args()
+
+    config = load_config()
+    jobs = load_jobs(config, args.only)
+    if not jobs:
+        print("No [job:<name>] sections in config.ini")
+        return 1
+    diagnostics.configure(capacity=config.getint("diagnostics", "ring_size", fallback=20),
+                          debug=config.getboolean("diagnostics", "debug", fallback=False))
+    max_concurrent = config.getint("jobs", "max_concurrent", fallback=MAX_CONCURRENT)
+    per_account = config.getint("jobs", "per_account", fallback=PER_ACCOUNT)
+
+    metrics_file = metrics.start_run("jobs")
+    start = time.perf_counter()
+    statuses = run_jobs(jobs, max_concurrent, per_account)
+    wall_seconds = time.perf_counter() - start
+
+    print(f"{'job':<20} {'status':<7} {'rows':>6} {'seconds':>8}  output")
+    for status in statuses:
+        print(f"{status['job']:<20} {status['status']:<7} {status['rows']:>6} "
+              f"{status['seconds']:>8.2f}  {status['output']}")
+    # Jobs sharing a scrape report its time, so count each scrape once
+    by_name = {status["job"]: status for status in statuses}
+    scrape_seconds = [by_name[group[0]["name"]]["seconds"] for group in group_scrapes(jobs)]
+    print(f"{len(jobs)} jobs in {len(scrape_seconds)} scrapes took {wall_seconds:.2f}s "
+          f"(slowest {max(scrape_seconds):.2f}s, "
+          f"{sum(scrape_seconds):.2f}s one after another)")
+    print(f"Statuses written to {write_status(statuses, wall_seconds)}")
+    print(f"Timings written to {metrics_file}")
+    return 0 if all(s["status"] != "failed" for s in statuses) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import (TimeoutException, NoSuchElementException,
+                                        StaleElementReferenceException, WebDriverException)
+
+# Candidate locators for every element the scraper looks for. ID and CSS lookups are
+# tried before broad XPath scans; the registry moves whichever one worked last to the front.
+LOCATORS = {
+    "username": [
+        (By.CSS_SELECTOR, "input[type='text'][name*='UserName']"),
+        (By.XPATH, "//input[@type='text' and contains(@name, 'UserName')]"),
+        (By.XPATH, "//input[@name='UserName' and contains(@id, 'UserName')]"),
+    ],
+    "password": [
+        (By.NAME, "Password"),
+        (By.CSS_SELECTOR, "input[type='password']"),
+    ],
+    "login_button": [
+        (By.CSS_SELECTOR, "input[type='submit']"),
+        (By.NAME, "Submit"),
+    ],
+    # Only what the logged-in pages show: the portal title cell is on the login form too
+    "login_success": [
+        (By.ID, "welcomeUser"),
+        (By.XPATH, "//span[contains(text(), 'Welcome REMT !')]"),
+    ],
+    "red_car": [
+        (By.CSS_SELECTOR, "img[src*='images/DownloadTrips.gif']"),
+        (By.XPATH, "//*[contains(text(), \"Download today's Trips/Set Rates/Generate Invoices\")]"),
+    ],
+    "trips_tab": [
+        (By.CSS_SELECTOR, "img[src*='/ITMSVP/images/tabTripsOnMART.gif']"),
+    ],
+    "next_page": [
+        (By.CSS_SELECTOR, "img[src*='arwSmallDownOn.gif']"),
+    ],
+    "page_size": [
+        (By.CSS_SELECTOR, "select[id*='PageSize' i], select[name*='PageSize' i]"),
+        (By.XPATH, "//select[option[normalize-space(.)='All' or normalize-space(.)='Show All']]"),
+    ],
+    "show_all": [
+        (By.XPATH, "//a[contains(@href, '__doPostBack') and (normalize-space(.)='All' or "
+                   "normalize-space(.)='Show All' or normalize-space(.)='View All')]"),
+    ],
+    "page_indicator": [
+        (By.XPATH, "//*[@id='grid_MainDataGrid']//*[contains(text(), 'Page')]"),
+        (By.XPATH, "//*[@id='grid_MainDataGrid']/following::*[contains(text(), 'Page')]"),
+        (By.XPATH, "//*[contains(text(), 'Page')]"),
+    ],
+}
+
+# Cheaper lookup strategies first when nothing has been learned yet
+STRATEGY_ORDER = {By.ID: 0, By.NAME: 1, By.CSS_SELECTOR: 2, By.XPATH: 3}
+
+STORE_PATH = Path(__file__).parent / 'locator_cache.json'
+POLL_INTERVAL = 0.1
+
+def wait_for_any(driver, locators, timeout=10, condition=EC.presence_of_element_located,
+                 poll=POLL_INTERVAL):
+    """Poll every alternative in one loop under a shared deadline
+
+    Returns (element, index of the locator that matched) as soon as any of them appears,
+    so the worst case is one timeout rather than the sum of one timeout per alternative.
+    """
+    checks = [condition(locator) for locator in locators]
+    deadline = time.monotonic() + timeout
+    while True:
+        for index, check in enumerate(checks):
+            try:
+                element = check(driver)
+            except WebDriverException:
+                # Missing, stale, or the document is being replaced mid-postback
+                continue
+            if element:
+                return element, index
+        if time.monotonic() >= deadline:
+            raise TimeoutException(f"None of {len(locators)} alternatives appeared in {timeout}s")
+        time.sleep(poll)
+
+class LocatorRegistry:
+    """Finds elements from candidate lists, learning and persisting which candidate works"""
+    def __init__(self, locators=LOCATORS, store_path=STORE_PATH):
+        self.locators = locators
+        self.store_path = Path(store_path) if store_path else None
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.winners = {}
+        if self.store_path and self.store_path.exists():
+            try:
+                stored = json.loads(self.store_path.read_text(encoding="utf-8"))
+                self.winners = {name: tuple(winner) for name, winner in stored.get("winners", {}).items()}
+            except (OSError, ValueError):
+                pass
+
+    def candidates(self, name):
+        """Candidates for a locator, the last winner first, then cheapest strategy first"""
+        ordered = sorted(self.locators[name], key=lambda locator: STRATEGY_ORDER.get(locator[0], 9))
+        winner = self.winners.get(name)
+        if winner in ordered:
+            ordered.remove(winner)
+            ordered.insert(0, winner)
+        return ordered
+
+    def record(self, name, locator, hit, seconds):
+        """Add a lookup's outcome to the stats and remember a new winner"""
+        with self.lock:
+            stats = self.stats.setdefault(name, {"hits": 0, "misses": 0,
+                                                 "hit_seconds": 0.0, "miss_seconds": 0.0})
+            if hit:
+                stats["hits"] += 1
+                stats["hit_seconds"] += seconds
+                if self.winners.get(name) != tuple(locator):
+                    self.winners[name] = tuple(locator)
+                    self.save()
+            else:
+                stats["misses"] += 1
+                stats["miss_seconds"] += seconds
+
+    def save(self):
+        if not self.store_path:
+            return
+        try:
+            self.store_path.write_text(json.dumps({"winners": self.winners, "stats": self.stats},
+                                                  indent=2), encoding="utf-8")
+        except OSError as e:
+            print(f"Could not save locator cache: {e}")
+
+    def find(self, driver, name, timeout=10, condition=EC.presence_of_element_located):
+        """Wait for whichever candidate appears first, all under one deadline"""
+        candidates = self.candidates(name)
+        start = time.perf_counter()
+        try:
+            element, index = wait_for_any(driver, candidates, timeout, condition)
+        except TimeoutException:
+            # All candidates were polled together, so the wait is split between them rather
+            # than charged to each
+            share = (time.perf_counter() - start) / len(candidates)
+            for locator in candidates:
+                self.record(name, locator, False, share)
+            raise NoSuchElementException(f"Could not find {name}")
+
+        elapsed = time.perf_counter() - start
+        # Candidates ranked ahead of the match missed: the page has drifted from what we
+        # learned. They were polled alongside the match, so the wait is the match's alone
+        for locator in candidates[:index]:
+            self.record(name, locator, False, 0.0)
+        self.record(name, candidates[index], True, elapsed)
+        return element
+
+    def tab(self, image=""):
+        """Locator name for the grid tab drawn with image, the MH Trips tab when image is empty"""
+        if not image:
+            return "trips_tab"
+        name = f"tab:{image}"
+        with self.lock:
+            # Tabs are images named after them; match case-insensitively as config values are lowercased
+            self.locators.setdefault(name, [(By.CSS_SELECTOR, f"img[src*='{image}' i]")])
+        return name
+
+    def first_match(self, driver, name, parse):
+        """Return parse(element) for the first present element it accepts, without waiting"""
+        for locator in self.candidates(name):
+            start = time.perf_counter()
+            for element in driver.find_elements(*locator):
+                try:
+                    value = parse(element)
+                except StaleElementReferenceException:
+                    continue
+                if value is not None:
+                    self.record(name, locator, True, time.perf_counter() - start)
+                    return value
+            self.record(name, locator, False, time.perf_counter() - start)
+        return None
+
+    def report(self):
+        """Print hit/miss timings per locator; misses mean the site no longer matches a candidate"""
+        with self.lock:
+            for name, stats in sorted(self.stats.items()):
+                print(f"Locator {name}: {stats['hits']} hits ({stats['hit_seconds']:.2f}s), "
+                      f"{stats['misses']} misses ({stats['miss_seconds']:.2f}s)")
+                if stats["miss_seconds"] > 1:
+                    print(f"Warning: {stats['miss_seconds']:.1f}s lost to misses on {name}, "
+                          f"the portal may have changed")
+            self.save()
+
+# Shared registry used by the scraper modules
+registry = LocatorRegistry()
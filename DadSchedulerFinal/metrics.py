@@ -0,0 +1,159 @@
+"""Per-phase timing for the scraper and report scripts.
+
+Wrap a stage in `with span("login"):` and its wall and CPU time go to a JSON-lines
+file, one per run, in the metrics folder. Compare two runs with:
+
+    python metrics.py compare metrics/webscraper_<old>.jsonl metrics/webscraper_<new>.jsonl
+    python metrics.py summary metrics/cleanup_<run>.jsonl
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+METRICS_DIR = Path(__file__).parent / 'metrics'
+# A span is a regression when it is this much slower (and at least MIN_SECONDS slower)
+REGRESSION_THRESHOLD = 0.20
+MIN_SECONDS = 0.05
+
+class MetricsRecorder:
+    """Writes one JSON line per finished span to this run's metrics file"""
+    def __init__(self, root=METRICS_DIR):
+        self.root = Path(root)
+        self.path = None
+        self.run_id = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def start_run(self, script, root=None):
+        """Open a new metrics file for a run of script"""
+        if root:
+            self.root = Path(root)
+        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.path = self.root / f"{script}_{self.run_id}.jsonl"
+        return self.path
+
+    def write(self, record):
+        if self.path is None:
+            return
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+    @contextmanager
+    def span(self, name, **fields):
+        """Time the wrapped block's wall time and its thread's CPU time and record it under name"""
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        parent = stack[-1] if stack else None
+        stack.append(name)
+
+        status = "ok"
+        started = datetime.now().isoformat(timespec="milliseconds")
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield fields
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            stack.pop()
+            self.write({
+                "run_id": self.run_id,
+                "span": name,
+                "parent": parent,
+                "thread": threading.current_thread().name,
+                "started": started,
+                "wall_seconds": round(time.perf_counter() - wall_start, 6),
+                "cpu_seconds": round(time.thread_time() - cpu_start, 6),
+                "status": status,
+                **fields,
+            })
+
+# Shared recorder; `span` is what the scripts import
+metrics = MetricsRecorder()
+span = metrics.span
+
+def load_spans(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def summarize(records):
+    """Total and mean wall/CPU seconds per span name"""
+    summary = {}
+    for record in records:
+        entry = summary.setdefault(record["span"], {"count": 0, "wall_seconds": 0.0,
+                                                    "cpu_seconds": 0.0, "errors": 0})
+        entry["count"] += 1
+        entry["wall_seconds"] += record["wall_seconds"]
+        entry["cpu_seconds"] += record["cpu_seconds"]
+        entry["errors"] += record["status"] != "ok"
+    for entry in summary.values():
+        entry["mean_wall_seconds"] = entry["wall_seconds"] / entry["count"]
+    return summary
+
+def compare_runs(base_records, new_records, threshold=REGRESSION_THRESHOLD, min_seconds=MIN_SECONDS):
+    """Compare per-span timings, returning rows with a regression flag
+
+    Spans that repeat (one per page) are compared on their mean so a longer export is not
+    reported as a slowdown.
+    """
+    base, new = summarize(base_records), summarize(new_records)
+    rows = []
+    for name in list(base) + [n for n in new if n not in base]:
+        if name not in base or name not in new:
+            rows.append({"span": name, "base": base.get(name), "new": new.get(name),
+                         "change": None, "regression": False})
+            continue
+        key = "mean_wall_seconds" if base[name]["count"] > 1 or new[name]["count"] > 1 else "wall_seconds"
+        old_value, new_value = base[name][key], new[name][key]
+        change = (new_value - old_value) / old_value if old_value else None
+        regression = (new_value - old_value > min_seconds
+                      and (change is None or change > threshold))
+        rows.append({"span": name, "metric": key, "base_seconds": old_value,
+                     "new_seconds": new_value, "change": change, "regression": regression})
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and compare pipeline run metrics")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser("summary", help="per-span totals for one run")
+    summary_parser.add_argument("run")
+    compare_parser = subparsers.add_parser("compare", help="flag spans that got slower")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                                help="relative slowdown that counts as a regression")
+    compare_parser.add_argument("--min-seconds", type=float, default=MIN_SECONDS,
+                                help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        for name, entry in summarize(load_spans(args.run)).items():
+            print(f"{name:<24} x{entry['count']:<4} wall {entry['wall_seconds']:8.3f}s  "
+                  f"cpu {entry['cpu_seconds']:8.3f}s  errors {entry['errors']}")
+        return 0
+
+    rows = compare_runs(load_spans(args.base), load_spans(args.new), args.threshold, args.min_seconds)
+    regressions = 0
+    for row in rows:
+        if "metric" not in row:
+            print(f"{row['span']:<24} only in {'base' if row['new'] is None else 'new'} run")
+            continue
+        change = f"{row['change']:+.0%}" if row["change"] is not None else "n/a"
+        flag = "  REGRESSION" if row["regression"] else ""
+        regressions += row["regression"]
+        print(f"{row['span']:<24} {row['base_seconds']:8.3f}s -> {row['new_seconds']:8.3f}s "
+              f"({change}){flag}")
+    print(f"{regressions} regression(s)")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
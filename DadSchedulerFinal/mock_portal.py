@@ -0,0 +1,348 @@
+"""Local stand-in for the vendor portal, for exercising the scrapers offline.
+
+Synthetic mode generates the login form, landing page, Trips tab and a paginated
+grid with as many rows and pages as you ask for, optionally slowed down:
+
+    python mock_portal.py --rows 600 --pages 6 --latency 0.3 --port 8765
+
+Add --page-sizes 100 250 500 to render a page-size dropdown (plus "All") above the grid.
+
+Replay mode serves pages recorded from the real portal. Save each page the
+scraper walks through (browser "Save page as", HTML only) into one folder:
+
+    login.html      the login form
+    home.html       the landing page with the DownloadTrips.gif red car
+    trips_1.html    first grid page, then trips_2.html, trips_3.html, ...
+
+Then run:
+
+    python mock_portal.py --replay recordings --port 8765
+
+and point [credentials] url in config.ini at http://127.0.0.1:8765/ITMSVP/
+"""
+import argparse
+import base64
+import html
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from lxml import html as lxml_html
+
+# 1x1 transparent GIF served for every image the pages reference
+BLANK_GIF = base64.b64decode("R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7")
+
+def set_viewstate(page_html, token):
+    """Stamp a page's __VIEWSTATE with a token so the next postback says where it came from"""
+    doc = lxml_html.fromstring(page_html)
+    forms = doc.xpath("//form")
+    if forms:
+        fields = doc.xpath("//input[@name='__VIEWSTATE']")
+        if fields:
+            fields[0].set("value", token)
+        else:
+            field = lxml_html.Element("input", type="hidden", name="__VIEWSTATE",
+                                      id="__VIEWSTATE", value=token)
+            forms[0].insert(0, field)
+    return lxml_html.tostring(doc, doctype="<!DOCTYPE html>", encoding="unicode")
+
+class ReplayPortal:
+    """Serves recorded portal pages in the order the scraper visits them"""
+    def __init__(self, folder):
+        folder = Path(folder)
+        self.pages = {"login": (folder / "login.html").read_text(encoding="utf-8")}
+        self.sequence = ["home"]
+        self.pages["home"] = (folder / "home.html").read_text(encoding="utf-8")
+
+        page_number = 1
+        while (folder / f"trips_{page_number}.html").exists():
+            name = f"trips_{page_number}"
+            self.pages[name] = (folder / f"{name}.html").read_text(encoding="utf-8")
+            self.sequence.append(name)
+            page_number += 1
+
+    def render(self, name):
+        return set_viewstate(self.pages[name], f"replay:{name}")
+
+    def handle(self, method, path, form):
+        """Return (status, content type, body) for a request"""
+        if method == "GET":
+            return 200, "text/html; charset=utf-8", self.render("login")
+
+        # The login form is the only one that posts a password
+        if any("password" in key.lower() and value for key, value in form.items()):
+            return 200, "text/html; charset=utf-8", self.render("home")
+
+        # Any other postback moves one step along the recording
+        came_from = form.get("__VIEWSTATE", "").replace("replay:", "")
+        if came_from in self.sequence:
+            position = min(self.sequence.index(came_from) + 1, len(self.sequence) - 1)
+            return 200, "text/html; charset=utf-8", self.render(self.sequence[position])
+        return 200, "text/html; charset=utf-8", self.render("login")
+
+# The grid's columns, in the order the real portal shows them
+GRID_HEADERS = [
+    "Trip Accepted", "Vehicle Type", "Name", "Phone", "Date",
+    "Trip Direction", "P/U Time", "Appt Time", "P/U Address/Entrance",
+    "P/U City", "Drop Address/Entrance", "Drop City", "Miles",
+    "Fare", "Trip Type", "StandingOrder Id", "One Way", "Comments"
+]
+
+FIRST_NAMES = ["Maria", "John", "Linda", "Robert", "Ana", "James", "Patricia", "Luis",
+               "Barbara", "Michael", "Rosa", "David", "Susan", "Jose", "Karen", "Thomas"]
+LAST_NAMES = ["Smith", "Garcia", "Johnson", "Rodriguez", "Brown", "Lopez", "Miller", "Perez",
+              "Davis", "Martinez", "Wilson", "Gonzalez", "Moore", "Rivera", "Taylor", "Nguyen"]
+STREETS = ["Main St", "Water St", "Elm St", "Pleasant St", "Summer St", "Central Ave",
+           "Lancaster St", "Mechanic St", "Park Ave", "School St"]
+CITIES = ["FITCHBURG", "LEOMINSTER", "GARDNER", "WORCESTER", "GROTON", "AYER", "CLINTON"]
+PLACES = ["UMASS MEMORIAL HEALTHALLIANCE", "DIALYSIS CENTER", "HEYWOOD HOSPITAL",
+          "COMMUNITY HEALTH CONNECTIONS", "PHYSICAL THERAPY ASSOC", "ADULT DAY HEALTH"]
+# Mostly blank, with the monitor wording the report looks for and a few near misses
+COMMENTS = ["", "", "", "", "", "MONITOR REQUIRED", "MT to ride with client", "Wheelchair",
+            "Call on arrival", "EMT will meet at door", "Uses walker", "Monitor must ride along"]
+
+def synthetic_rows(count, seed=0, trip_date=None):
+    """Generate grid rows like the portal's, including the blank cells that shift columns
+
+    Riders mostly make round trips, DAR and Taxi trips are never marked accepted and a few
+    riders have no phone number.
+    """
+    rng = random.Random(seed)
+    trip_date = trip_date or (datetime.now() + timedelta(days=1))
+    rows = []
+    while len(rows) < count:
+        name = f"{rng.choice(LAST_NAMES).upper()}, {rng.choice(FIRST_NAMES).upper()}"
+        vehicle = rng.choice(["Ambulatory", "Ambulatory", "Wheelchair", "DAR", "Taxi"])
+        phone = "" if rng.random() < 0.05 else f"978-{rng.randint(200, 999)}-{rng.randint(0, 9999):04d}"
+        home = f"{rng.randint(1, 999)} {rng.choice(STREETS)}"
+        home_city = rng.choice(CITIES)
+        place = rng.choice(PLACES)
+        place_city = rng.choice(CITIES)
+        pickup = trip_date.replace(hour=rng.randint(5, 13), minute=rng.choice([0, 15, 30, 45]))
+        miles = round(rng.uniform(1, 30), 1)
+        standing_order = str(rng.randint(100000, 999999)) if rng.random() < 0.4 else ""
+        comments = rng.choice(COMMENTS)
+        legs = [("To", pickup, home, home_city, place, place_city)]
+        if rng.random() < 0.8:
+            legs.append(("From", pickup + timedelta(hours=rng.randint(1, 4)),
+                         place, place_city, home, home_city))
+        for direction, when, pickup_address, pickup_city, drop_address, drop_city in legs:
+            rows.append([
+                "" if vehicle in ("DAR", "Taxi") else "Yes",
+                vehicle, name, phone, trip_date.strftime("%m/%d/%Y"), direction,
+                when.strftime("%I:%M %p"), (when + timedelta(minutes=45)).strftime("%I:%M %p"),
+                pickup_address, pickup_city, drop_address, drop_city, f"{miles:.1f}",
+                f"${miles * 2.5 + 12:.2f}", "Medical", standing_order,
+                "Y" if len(legs) == 1 else "N", comments,
+            ])
+    return rows[:count]
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><title>ITMS Vendor Portal</title>
+<script>
+function __doPostBack(target, argument) {{
+    var form = document.forms[0];
+    form.__EVENTTARGET.value = target;
+    form.__EVENTARGUMENT.value = argument;
+    form.submit();
+}}
+</script></head>
+<body><form method="post" action="{action}">
+<input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="" />
+<input type="hidden" name="__EVENTARGUMENT" id="__EVENTARGUMENT" value="" />
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{viewstate}" />
+{body}
+</form></body></html>"""
+
+SELECTED = " selected=\"selected\""
+
+def postback_image(target, src, alt):
+    """An image wrapped in a __doPostBack link, the way the portal renders its buttons"""
+    return (f"<a href=\"javascript:__doPostBack('{target}','')\">"
+            f"<img src=\"/ITMSVP/images/{src}\" alt=\"{alt}\" width=\"24\" height=\"24\" /></a>")
+
+class SyntheticPortal:
+    """Generates the portal's pages for any number of rows and pages
+
+    State travels in __VIEWSTATE like in ASP.NET, so any number of sessions can walk
+    the grid at once. latency seconds are added to every page response, and error_rate
+    of the grid postbacks fail with a 503 to exercise the scrapers' retries. With
+    page_sizes the grid gets an auto-postback page-size dropdown offering them and "All".
+    """
+    def __init__(self, rows=250, pages=5, latency=0.0, seed=0, error_rate=0.0, page_sizes=None):
+        self.rows = synthetic_rows(rows, seed)
+        self.pages = max(1, pages)
+        self.page_size = max(1, math.ceil(len(self.rows) / self.pages))
+        self.page_sizes = sorted(set(page_sizes or []))
+        self.latency = latency
+        self.error_rate = error_rate
+        self.errors = random.Random(seed)
+
+    def page(self, action, viewstate, body):
+        return PAGE_TEMPLATE.format(action=action, viewstate=viewstate, body=body)
+
+    def login_page(self):
+        return self.page("Login.aspx", "synthetic:login", """
+<table><tr><td>ITMS Vendor Portal Login</td></tr>
+<tr><td>User Name <input type="text" name="ctl00$Main$UserName" id="ctl00_Main_UserName" /></td></tr>
+<tr><td>Password <input type="password" name="Password" id="Password" /></td></tr>
+<tr><td><input type="submit" name="Submit" value="Log In" /></td></tr></table>""")
+
+    def home_page(self):
+        return self.page("Home.aspx", "synthetic:home", f"""
+<span id="welcomeUser">Welcome REMT !</span>
+<table><tr><td>{postback_image("ctl00$Main$lnkTrips", "DownloadTrips.gif", "Trips")}
+Download today's Trips/Set Rates/Generate Invoices</td></tr></table>""")
+
+    def trips_menu_page(self):
+        return self.page("Trips.aspx", "synthetic:menu", f"""
+<span id="welcomeUser">Welcome REMT !</span>
+<div>{postback_image("ctl00$Main$tabTrips", "tabTripsOnMART.gif", "MH Trips")}</div>""")
+
+    def page_count(self, page_size):
+        return max(1, math.ceil(len(self.rows) / page_size))
+
+    def page_size_control(self, page_size):
+        """Auto-postback dropdown like an ASP.NET DropDownList, 0 meaning every row"""
+        sizes = sorted(set(self.page_sizes) | {self.page_size})
+        options = [(str(size), str(size)) for size in sizes] + [("0", "All")]
+        selected = str(page_size) if page_size in sizes else "0"
+        rendered = "".join(
+            f"<option value=\"{value}\"{SELECTED if value == selected else ''}>{label}</option>"
+            for value, label in options)
+        return ("<div>Rows per page <select name=\"grid$PageSize\" id=\"grid_PageSize\" "
+                "onchange=\"javascript:setTimeout('__doPostBack(\\'grid$PageSize\\',\\'\\')', 0)\">"
+                f"{rendered}</select></div>")
+
+    def grid_page(self, page_number, page_size=None):
+        page_size = page_size or self.page_size
+        pages = self.page_count(page_size)
+        start = (page_number - 1) * page_size
+        lines = [self.page_size_control(page_size)] if self.page_sizes else []
+        lines += ["<table id=\"grid_MainDataGrid\"><tbody>",
+                 "<tr class=\"DataGrid-HeaderStyle\"><td></td>"
+                 + "".join(f"<td>{html.escape(h)}</td>" for h in GRID_HEADERS) + "</tr>"]
+        for row in self.rows[start:start + page_size]:
+            cells = ["<td class=\"DataGrid-SelectColumn\"><input type=\"checkbox\" /></td>",
+                     f"<td class=\"aspNetDisabled DataGrid-ItemStyle-ControlColumn\">{row[0]}</td>"]
+            cells += [f"<td class=\"DataGrid-ItemStyle\">{html.escape(value)}</td>" for value in row[1:]]
+            lines.append("<tr>" + "".join(cells) + "</tr>")
+        lines.append("</tbody></table>")
+
+        # Pager below the grid: indicator, numbered links for nearby pages and the next arrow
+        pager = [f"<span class=\"PagerInfo\">Page {page_number} of {pages}</span>"]
+        first_link = (page_number - 1) // 10 * 10 + 1
+        for number in range(first_link, min(first_link + 9, pages) + 1):
+            if number == page_number:
+                pager.append(f"<span>{number}</span>")
+            else:
+                pager.append(f"<a href=\"javascript:__doPostBack('grid$Page','{number}')\">{number}</a>")
+        if page_number < pages:
+            pager.append(postback_image("grid$Next", "arwSmallDownOn.gif", "Next"))
+        lines.append("<div class=\"Pager\">" + " ".join(pager) + "</div>")
+        return self.page("Trips.aspx", f"synthetic:grid:{page_number}:{page_size}", "\n".join(lines))
+
+    def handle(self, method, path, form):
+        """Return (status, content type, body) for a request"""
+        if self.latency:
+            time.sleep(self.latency)
+        content_type = "text/html; charset=utf-8"
+        if method == "GET":
+            return 200, content_type, self.login_page()
+
+        state = form.get("__VIEWSTATE", "").split(":")
+        target = form.get("__EVENTTARGET", "")
+        argument = form.get("__EVENTARGUMENT", "")
+        if state[1:2] == ["login"]:
+            if form.get("Password"):
+                return 200, content_type, self.home_page()
+            return 200, content_type, self.login_page()
+        if target.endswith("lnkTrips"):
+            return 200, content_type, self.trips_menu_page()
+        if target.endswith("tabTrips"):
+            return 200, content_type, self.grid_page(1)
+        if state[1:2] == ["grid"]:
+            if self.error_rate and self.errors.random() < self.error_rate:
+                return 503, "text/html; charset=utf-8", "<html><body>Service Unavailable</body></html>"
+            current, page_size = int(state[2]), int(state[3])
+            pages = self.page_count(page_size)
+            if target == "grid$Next":
+                current = min(current + 1, pages)
+            elif target == "grid$Page" and argument.isdigit():
+                current = min(max(int(argument), 1), pages)
+            elif target == "grid$PageSize" and form.get("grid$PageSize", "").isdigit():
+                # A new page size starts the grid over on page 1
+                current, page_size = 1, int(form["grid$PageSize"]) or len(self.rows)
+            return 200, content_type, self.grid_page(current, page_size)
+        return 200, content_type, self.home_page()
+
+def make_handler(portal):
+    """Build a request handler class bound to a portal"""
+    class PortalHandler(BaseHTTPRequestHandler):
+        def respond(self, method, form):
+            if self.path.lower().split("?")[0].endswith((".gif", ".png", ".jpg")):
+                status, content_type, body = 200, "image/gif", BLANK_GIF
+            else:
+                status, content_type, body = portal.handle(method, self.path, form)
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self.respond("GET", {})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            posted = parse_qs(self.rfile.read(length).decode("utf-8"), keep_blank_values=True)
+            self.respond("POST", {key: values[-1] for key, values in posted.items()})
+
+        def log_message(self, format, *args):
+            # Keep benchmark output quiet
+            pass
+
+    return PortalHandler
+
+def start_server(portal, port=0):
+    """Start the portal on a background thread, returning (server, base url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(portal))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/ITMSVP/"
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the vendor portal")
+    parser.add_argument("--replay", help="folder of recorded portal pages (default: synthetic pages)")
+    parser.add_argument("--rows", type=int, default=250, help="synthetic grid rows in total")
+    parser.add_argument("--pages", type=int, default=5, help="synthetic grid pages")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every page")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic rows")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of grid postbacks that fail with a 503")
+    parser.add_argument("--page-sizes", type=int, nargs="+",
+                        help="offer these page sizes (and All) in a dropdown above the grid")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.replay:
+        portal = ReplayPortal(args.replay)
+    else:
+        portal = SyntheticPortal(args.rows, args.pages, args.latency, args.seed, args.error_rate,
+                                 args.page_sizes)
+    server, url = start_server(portal, args.port)
+    print(f"Mock portal running at {url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
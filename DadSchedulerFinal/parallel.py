@@ -0,0 +1,169 @@
+import math
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from webscraper import (setup_driver, driver_options, open_trips_grid, scrape_table_data,
+                        go_to_page, merge_page_data)
+from waits import read_page_indicator
+
+# How many times a page range is tried before the run gives up on it
+MAX_PAGE_ATTEMPTS = 3
+
+def start_session(url, username, password, settings):
+    """Start a browser and log it in, returning None if it cannot reach the grid"""
+    driver = setup_driver(*driver_options(settings))
+    try:
+        if open_trips_grid(driver, url, username, password, settings["page_timeout"],
+                           settings["poll_interval"], settings["tab"], settings["max_page_size"]):
+            return driver
+    except Exception as e:
+        print(f"Error starting session: {e}")
+    driver.quit()
+    return None
+
+def split_pages(total_pages, sessions):
+    """Split pages 1..total_pages into contiguous ranges, one per session"""
+    size = math.ceil(total_pages / sessions)
+    return [list(range(start, min(start + size, total_pages + 1)))
+            for start in range(1, total_pages + 1, size)]
+
+def page_worker(worker_id, driver, work, results, failures, state, options):
+    """Scrape page ranges from the shared queue until a None sentinel arrives"""
+    url, username, password, settings = options
+    page_timeout, poll = settings["page_timeout"], settings["poll_interval"]
+
+    def reopen():
+        return open_trips_grid(driver, url, username, password, page_timeout, poll,
+                               settings["tab"], settings["max_page_size"])
+
+    while True:
+        item = work.get()
+        if item is None:
+            work.task_done()
+            return
+
+        # Leave a range this session already failed on to another live session
+        with state["lock"]:
+            others_available = state["live"] > len(item["failed_on"] | {worker_id})
+        if worker_id in item["failed_on"] and others_available:
+            work.put(item)
+            work.task_done()
+            time.sleep(0.2)
+            continue
+
+        pages = item["pages"]
+        for index, page in enumerate(pages):
+            try:
+                if not go_to_page(driver, page, page_timeout, poll):
+                    # Behind us or lost our place: reopen the grid and walk forward again
+                    if not (reopen() and go_to_page(driver, page, page_timeout, poll)):
+                        raise RuntimeError(f"could not navigate to page {page}")
+
+                page_data = scrape_table_data(driver, bulk=settings["bulk_extraction"])
+                if not page_data:
+                    raise RuntimeError(f"page {page} returned no data")
+                results[page] = page_data
+                print(f"[session {worker_id}] scraped page {page}")
+
+            except Exception as e:
+                remaining = pages[index:]
+                attempt = item["attempt"] + 1
+                print(f"[session {worker_id}] failed on page {page} (attempt {attempt}): {e}")
+                if attempt < MAX_PAGE_ATTEMPTS:
+                    work.put({"pages": remaining, "attempt": attempt,
+                              "failed_on": item["failed_on"] | {worker_id}})
+                else:
+                    failures.extend(remaining)
+
+                # Start this session over so it is usable for the next range
+                try:
+                    healthy = reopen()
+                except Exception:
+                    healthy = False
+                if not healthy:
+                    print(f"[session {worker_id}] could not recover, retiring session")
+                    with state["lock"]:
+                        state["live"] -= 1
+                    work.task_done()
+                    # Keep draining so queued work and the sentinel are not stranded
+                    return drain_queue(work, failures, state)
+                break
+
+        work.task_done()
+
+def drain_queue(work, failures, state):
+    """Used by a retired session: hand work back while others live, fail it when none do"""
+    while True:
+        item = work.get()
+        if item is None:
+            work.task_done()
+            return
+        with state["lock"]:
+            nobody_left = state["live"] <= 0
+        if nobody_left:
+            failures.extend(item["pages"])
+        else:
+            work.put(item)
+            time.sleep(0.2)
+        work.task_done()
+
+def scrape_pages_parallel(url, username, password, settings):
+    """Scrape all grid pages with a pool of logged-in browser sessions"""
+    sessions = settings["parallel_sessions"]
+    start = time.perf_counter()
+    print(f"Starting {sessions} browser sessions")
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        drivers = list(pool.map(lambda _: start_session(url, username, password, settings),
+                                range(sessions)))
+    drivers = [driver for driver in drivers if driver is not None]
+    if not drivers:
+        print("No session could log in. Exiting.")
+        return None
+
+    try:
+        indicator = read_page_indicator(drivers[0])
+        total_pages = indicator[1] if indicator else 1
+        print(f"{len(drivers)} sessions ready, {total_pages} pages to scrape")
+
+        # Hand out one contiguous range per session; failed ranges come back on the queue
+        work = queue.Queue()
+        for pages in split_pages(total_pages, len(drivers)):
+            work.put({"pages": pages, "attempt": 0, "failed_on": frozenset()})
+
+        results = {}
+        failures = []
+        state = {"lock": threading.Lock(), "live": len(drivers)}
+        options = (url, username, password, settings)
+        workers = [
+            threading.Thread(target=page_worker,
+                             args=(worker_id, driver, work, results, failures, state, options))
+            for worker_id, driver in enumerate(drivers, start=1)
+        ]
+        for worker in workers:
+            worker.start()
+
+        # Wait for every range, including retries, then stop the sessions
+        work.join()
+        for _ in workers:
+            work.put(None)
+        for worker in workers:
+            worker.join()
+
+        # Merge back in page order with the header row kept once
+        all_data = []
+        for page in sorted(results):
+            merge_page_data(all_data, results[page])
+
+        print(f"Scraped {len(results)} of {total_pages} pages with {len(drivers)} sessions "
+              f"in {time.perf_counter() - start:.2f}s")
+        if failures:
+            # A schedule with missing trips is worse than no schedule
+            print(f"Pages {sorted(set(failures))} failed after {MAX_PAGE_ATTEMPTS} attempts. Exiting.")
+            return None
+        return all_data
+
+    finally:
+        for driver in drivers:
+            driver.quit()
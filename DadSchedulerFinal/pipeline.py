@@ -0,0 +1,253 @@
+"""Scrape, transform and render the schedule report in one process.
+
+    python pipeline.py                       # every stage, what runscript.bat runs
+    python pipeline.py --from transform      # rebuild the report from the saved export
+    python pipeline.py --only render         # re-render the document from the cached table
+
+runscriptdad.bat passes --log, --scrape-log and --report-log so the run keeps writing
+scraper_output.log, report_output.log and the log.txt lines the bat files always wrote,
+each as its stage finishes.
+
+Stages hand their DataFrame to the next one in memory, and the transform runs on
+each page while the scraper fetches the next one. Each stage also leaves its result
+on disk (the MART_Trips export, then the report table), which is what a stage started
+on its own reads. Exit codes: 0 done, 1 scraping failed, 2 report generation failed.
+"""
+import argparse
+import contextlib
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from metrics import metrics, span
+
+STAGES = ["scrape", "transform", "render"]
+EXIT_SCRAPE_FAILED = 1
+EXIT_REPORT_FAILED = 2
+
+OUTPUT_FOLDER = os.path.join(os.path.expanduser("~"), "Downloads", "WebScrapedData")
+
+def stage_paths(report_date, folder=OUTPUT_FOLDER):
+    """Where each stage leaves its result for the report date"""
+    os.makedirs(folder, exist_ok=True)
+    return {
+        "export": os.path.join(folder, f"MART_Trips_{report_date.strftime('%Y%m%d')}.xlsx"),
+        "table": os.path.join(folder, f"Schedule_report_{report_date.strftime('%m%d%Y')}.pkl"),
+        "report": os.path.join(folder, f"Schedule_report_{report_date.strftime('%m%d%Y')}.docx"),
+    }
+
+@contextlib.contextmanager
+def stage_log(path):
+    """Send everything printed inside the block to path, like a bat file's > path 2>&1"""
+    if not path:
+        yield
+        return
+    with open(path, "w", encoding="utf-8") as f, \
+            contextlib.redirect_stdout(f), contextlib.redirect_stderr(f):
+        yield
+
+def log_line(path, message, attach=None):
+    """Append a line to log.txt stamped like the bat files' %date% %time%, plus attach's text"""
+    if not path:
+        return
+    stamp = datetime.now().strftime("%a %m/%d/%Y %H:%M:%S.%f")[:-4]
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(f"{stamp} - {message}\n")
+        if attach and os.path.exists(attach):
+            with open(attach, encoding="utf-8", errors="replace") as attached:
+                f.write(attached.read())
+
+class PageConsumer:
+    """Transforms scraped pages on a worker thread while the scraper moves on
+
+    The scraper's on_page callback only queues the page, so it never waits on pandas.
+    """
+    def __init__(self):
+        from cleanup import ReportBuilder
+
+        self.builder = ReportBuilder()
+        self.pages = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name="report-consumer", daemon=True)
+        self.thread.start()
+
+    def on_page(self, page_number, page_data):
+        """scrape_all_pages callback: hand the page to the worker"""
+        if page_data:
+            self.pages.put((page_number, page_data))
+        return True
+
+    def run(self):
+        while True:
+            item = self.pages.get()
+            if item is None:
+                return
+            page_number, page_data = item
+            if self.error:
+                continue
+            try:
+                with span("stream_page", page=page_number, rows=len(page_data) - 1):
+                    self.builder.add_page(page_data[0], page_data[1:])
+            except Exception as e:
+                self.error = e
+
+    def finish(self, expected_rows):
+        """Wait for the queued pages and return the report table, or None if it is incomplete
+
+        expected_rows is the export's row count, or None when the scrape failed.
+        """
+        self.pages.put(None)
+        self.thread.join()
+        if expected_rows is None:
+            return None
+        if self.error:
+            print(f"Page-by-page transform failed ({self.error}), using the saved export")
+            return None
+        if self.builder.rows != expected_rows:
+            # Pages resumed from a checkpoint, carried over by an incremental run or
+            # scraped in parallel never went through on_page
+            print(f"Transformed {self.builder.rows} of {expected_rows} rows while scraping, "
+                  f"using the saved export")
+            return None
+        return self.builder.table()
+
+def scrape_stage(paths, on_page=None):
+    """Scrape the portal into the export, returning its DataFrame or None"""
+    from webscraper import load_config, run_scrape
+    return run_scrape(load_config(), paths["export"], on_page)
+
+def transform_stage(paths, export=None, streamed=None):
+    """Build the report table from the export, reading the saved export if none is passed
+
+    streamed is the table already built page by page during the scrape, when complete.
+    """
+    from cleanup import transform_report
+    from schema import read_export
+
+    if streamed is not None:
+        streamed.to_pickle(paths["table"])
+        return streamed
+
+    aligned = True
+    if export is None:
+        if not os.path.exists(paths["export"]):
+            raise FileNotFoundError(f"Excel file {paths['export']} not found")
+        print(f"Processing file: {paths['export']}")
+        with span("read_excel") as fields:
+            export, aligned = read_export(paths["export"])
+            fields["rows"] = len(export)
+            fields["aligned"] = aligned
+
+    table = transform_report(export, aligned)
+    # Cached so the render stage can be re-run on its own
+    table.to_pickle(paths["table"])
+    return table
+
+def render_stage(paths, report_date, table=None):
+    """Write the Word report, reading the cached report table if none is passed"""
+    import pandas as pd
+    from cleanup import render_report
+
+    if table is None:
+        if not os.path.exists(paths["table"]):
+            raise FileNotFoundError(f"Report table {paths['table']} not found, run the transform stage")
+        table = pd.read_pickle(paths["table"])
+
+    with span("docx_build", rows=len(table)):
+        render_report(table, paths["report"], report_date.strftime("%A, %B %d, %Y"))
+    print(f"Report successfully generated and saved as: {paths['report']}")
+
+def run_pipeline(first="scrape", last="render", report_date=None, stream=True, logs=None):
+    """Run stages first..last in order, returning the process exit code
+
+    logs optionally names files: "scrape" and "report" receive what those stages print,
+    and "log" gets the bat files' timeline lines.
+    """
+    logs = logs or {}
+    report_date = report_date or datetime.now() + timedelta(days=1)
+    paths = stage_paths(report_date)
+    stages = STAGES[STAGES.index(first):STAGES.index(last) + 1]
+    data = None
+    streamed = None
+
+    if "scrape" in stages:
+        with stage_log(logs.get("scrape")):
+            print("Running scraper...")
+            # Transform each page as it arrives so only the render is left when scraping ends
+            consumer = PageConsumer() if stream and "transform" in stages else None
+            try:
+                with span("stage_scrape"):
+                    data = scrape_stage(paths, consumer.on_page if consumer else None)
+            except Exception as e:
+                print(f"An error occurred: {e}")
+                data = None
+            scrape_finished = time.perf_counter()
+            if consumer:
+                streamed = consumer.finish(len(data) if data is not None else None)
+            if data is None:
+                print("Scraping failed, report generation skipped")
+            else:
+                print("Scraper completed successfully")
+        if data is None:
+            log_line(logs.get("log"), f"Scraper failed with error code {EXIT_SCRAPE_FAILED}",
+                     logs.get("scrape"))
+            return EXIT_SCRAPE_FAILED
+        log_line(logs.get("log"), "Scraper completed successfully")
+
+    if stages == ["scrape"]:
+        return 0
+    log_line(logs.get("log"), "Running report script...")
+    with stage_log(logs.get("report")):
+        try:
+            if "transform" in stages:
+                print("Running report transform...")
+                with span("stage_transform", streamed=streamed is not None):
+                    data = transform_stage(paths, data, streamed)
+            if "render" in stages:
+                print("Rendering report...")
+                with span("stage_render"):
+                    render_stage(paths, report_date, data)
+                if "scrape" in stages:
+                    print(f"Report ready {time.perf_counter() - scrape_finished:.2f}s after scraping finished")
+            failed = None
+        except Exception as e:
+            print(f"Report generation failed: {e}")
+            failed = e
+    if failed is not None:
+        log_line(logs.get("log"), f"Report generation failed with error code {EXIT_REPORT_FAILED}",
+                 logs.get("report"))
+        return EXIT_REPORT_FAILED
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape the portal and build the schedule report")
+    parser.add_argument("--from", dest="first", choices=STAGES, default="scrape",
+                        help="first stage to run (later stages start from the cached output)")
+    parser.add_argument("--to", dest="last", choices=STAGES, default="render",
+                        help="last stage to run")
+    parser.add_argument("--only", choices=STAGES, help="run a single stage")
+    parser.add_argument("--date", help="report date as YYYYMMDD (default tomorrow)")
+    parser.add_argument("--no-stream", action="store_true",
+                        help="transform the finished export instead of each page while scraping")
+    parser.add_argument("--log", help="append the bat files' timeline lines to this file (log.txt)")
+    parser.add_argument("--scrape-log", help="write what the scrape stage prints to this file")
+    parser.add_argument("--report-log", help="write what the transform and render stages print here")
+    args = parser.parse_args()
+
+    first, last = (args.only, args.only) if args.only else (args.first, args.last)
+    if STAGES.index(first) > STAGES.index(last):
+        parser.error(f"--from {first} comes after --to {last}")
+    report_date = datetime.strptime(args.date, "%Y%m%d") if args.date else None
+
+    metrics_file = metrics.start_run("pipeline")
+    exit_code = run_pipeline(first, last, report_date, stream=not args.no_stream,
+                             logs={"log": args.log, "scrape": args.scrape_log,
+                                   "report": args.report_log})
+    print(f"Timings written to {metrics_file}")
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
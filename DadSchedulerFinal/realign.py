@@ -0,0 +1,55 @@
+"""Declarative column realignment for exports that dropped blank cells.
+
+Older scraper exports skipped blank grid cells, so everything after a blank slid one
+column to the left. A ShiftRule names the column to test and the test; matching rows get
+width blank cells inserted at insert_at and the rest of the row moves right, dropping
+what falls off the end. realign applies a batch of rules as masked shifts over a single
+object array, in order, so each rule sees the rows as the rules before it left them.
+"""
+import numpy as np
+import pandas as pd
+
+class ShiftRule:
+    """Insert width blank cells at insert_at in every row where predicate(column) holds"""
+    def __init__(self, column, predicate, insert_at=None, width=1):
+        self.column = column
+        self.predicate = predicate
+        self.insert_at = column if insert_at is None else insert_at
+        self.width = width
+
+def one_of(*values):
+    """Predicate: the cell equals one of values"""
+    def predicate(cells):
+        return pd.Series(cells, dtype=object).isin(values).to_numpy(dtype=bool)
+    return predicate
+
+def matches(pattern):
+    """Predicate: the cell's text starts with a match of pattern, like re.match(pattern, str(cell))"""
+    def predicate(cells):
+        text = pd.Series(cells, dtype=object).astype(str)
+        return text.str.match(pattern).to_numpy(dtype=bool)
+    return predicate
+
+def realign(df, rules, counts=None):
+    """Apply the rules in order and return the realigned DataFrame
+
+    counts, when given, is filled with the number of rows each rule shifted, by column.
+    """
+    columns = list(df.columns)
+    width = len(columns)
+    values = df.to_numpy(dtype=object, copy=True)
+
+    for rule in rules:
+        column = columns.index(rule.column)
+        start = columns.index(rule.insert_at)
+        shift = min(rule.width, width - start)
+        rows = np.flatnonzero(rule.predicate(values[:, column]))
+        if counts is not None:
+            counts[rule.column] = counts.get(rule.column, 0) + len(rows)
+        if not len(rows):
+            continue
+        values[rows, start + shift:] = values[rows, start:width - shift]
+        values[rows, start:start + shift] = None
+
+    # Let pandas infer column types again, as building the frame from row lists did
+    return pd.DataFrame(values, columns=df.columns).infer_objects()
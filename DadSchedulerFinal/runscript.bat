@@ -1,7 +1,4 @@
 @echo off
-python C:\Users\user1\Documents\PythonRPA\DadScheduler\webscraper.py
-IF %ERRORLEVEL% EQU 0 (
-  python C:\Users\user1\Documents\PythonRPA\DadScheduler\cleanup.py
-) ELSE (
-  echo Scraping failed, report generation skipped
-)
\ No newline at end of file
+:: Scrape, transform and render in one process; pipeline.py prints which stage failed
+python C:\Users\user1\Documents\PythonRPA\DadScheduler\pipeline.py
+exit /b %ERRORLEVEL%
\ No newline at end of file
@@ -16,16 +16,11 @@ cd >> C:\Users\Mouhamadou\Documents\PythonProject\Scheduler\log.txt
 echo Python path: >> C:\Users\Mouhamadou\Documents\PythonProject\Scheduler\log.txt
 where python >> C:\Users\Mouhamadou\Documents\PythonProject\Scheduler\log.txt
 
-:: Run with full paths
+:: Run with full paths; pipeline.py scrapes and builds the report in one process, writing
+:: scraper_output.log, report_output.log and the log.txt lines below as each stage finishes
 echo %date% %time% - Running scraper script... >> C:\Users\user1\Documents\PythonRPA\DadScheduler\log.txt
-python C:\Users\user1\Documents\PythonRPA\DadScheduler\webscraper.py > C:\Users\user1\Documents\PythonRPA\DadScheduler\scraper_output.log 2>&1
-IF %ERRORLEVEL% EQU 0 (
-  echo %date% %time% - Scraper completed successfully >> C:\Users\user1\Documents\PythonRPA\DadScheduler\log.txt
-  echo %date% %time% - Running report script... >> C:\Users\user1\Documents\PythonRPA\DadScheduler\log.txt
-  python C:\Users\user1\Documents\PythonRPA\DadScheduler\cleanup.py > C:\Users\user1\Documents\PythonRPA\DadScheduler\report_output.log 2>&1
-) ELSE (
-  echo %date% %time% - Scraper failed with error code %ERRORLEVEL% >> C:\Users\user1\Documents\PythonRPA\DadScheduler\log.txt
-  type C:\PythonProject\scraper_output.log >> C:\Users\user1\Documents\PythonRPA\DadScheduler\log.txt
+python C:\Users\user1\Documents\PythonRPA\DadScheduler\pipeline.py --log C:\Users\user1\Documents\PythonRPA\DadScheduler\log.txt --scrape-log C:\Users\user1\Documents\PythonRPA\DadScheduler\scraper_output.log --report-log C:\Users\user1\Documents\PythonRPA\DadScheduler\report_output.log
+IF %ERRORLEVEL% EQU 1 (
   echo Scraping failed, report generation skipped
 )
 
@@ -5,7 +5,13 @@ import os
 from openpyxl import load_workbook
 from openpyxl.styles import Font, Border, Side, Alignment, PatternFill
 import win32com.client as win32
-import re
+from tagging import KeywordRule, TagRules
+
+# Comments that mean the rider travels with a monitor; MT has to be an upper-case word of its own
+MONITOR_RULES = TagRules([
+    KeywordRule("MONITOR", "*Monitored", prefix=True),
+    KeywordRule("MT", "*Monitored", case=True),
+])
 
 def generate_daily_schedule_report(input_file_path):
     """
@@ -43,14 +49,7 @@ def generate_daily_schedule_report(input_file_path):
     print("Dropped unnecessary columns")
     
     # Step 4: Add "*Monitored" to Names based on Comments
-    df['Name'] = df.apply(
-        lambda row: f"{row['Name']} *Monitored" 
-        if isinstance(row.get('Comments', ''), str) and 
-        (re.search(r'MONITOR', row['Comments'], re.IGNORECASE) or 
-         re.search(r'MT', row['Comments'], re.IGNORECASE))
-        else row['Name'],
-        axis=1
-    )
+    df = MONITOR_RULES.apply(df)
     print("Added *Monitored to names based on comments")
     
     # Step 5: Delete Comments Column
@@ -0,0 +1,129 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+
+# The trips grid's columns in portal order, with the type each is exported as.
+# Columns the portal adds later are exported as text.
+GRID_SCHEMA = {
+    "Trip Accepted": "text",
+    "Vehicle Type": "text",
+    "Name": "text",
+    "Phone": "text",
+    "Date": "date",
+    "Trip Direction": "text",
+    "P/U Time": "text",
+    "Appt Time": "text",
+    "P/U Address/Entrance": "text",
+    "P/U City": "text",
+    "Drop Address/Entrance": "text",
+    "Drop City": "text",
+    "Miles": "number",
+    "Fare": "currency",
+    "Trip Type": "text",
+    "StandingOrder Id": "integer",
+    "One Way": "text",
+    "Comments": "text",
+}
+
+# Exports written with every cell kept under its header use this sheet name. Older
+# exports (sheet "Sheet1") dropped blank cells and still need realigning in cleanup.
+EXPORT_SHEET = "Trips"
+
+DATE_FORMAT = "%m/%d/%Y"
+
+# Columnar copy of the export written next to the xlsx for cleanup to memory-map.
+# Uncompressed Arrow IPC so reading it maps the file instead of parsing it.
+SIDECAR_SUFFIX = ".arrow"
+
+def convert_column(values, kind):
+    """Convert a text column to its schema type, or return it unchanged if any value does not fit"""
+    if kind == "text":
+        return values
+    if kind == "date":
+        converted = pd.to_datetime(values, format=DATE_FORMAT, errors="coerce").dt.date
+    else:
+        if kind == "currency":
+            values = values.str.replace(r"[$,]", "", regex=True)
+        converted = pd.to_numeric(values, errors="coerce")
+        if kind == "integer" and not (converted.dropna() % 1).any():
+            converted = converted.astype("Int64")
+
+    # A value that does not parse means the portal changed the column; keep the text
+    if (converted.isna() & values.notna()).any():
+        return values
+    return converted
+
+def typed_frame(headers, rows):
+    """Build the export DataFrame from position-aligned rows
+
+    Cells stay in the column of the header above them, blank cells become nulls and
+    columns without a header (the grid's select column) are dropped.
+    """
+    keep = [i for i, header in enumerate(headers) if header]
+    data = [[(row[i] if i < len(row) else None) or None for i in keep] for row in rows]
+    df = pd.DataFrame(data, columns=[headers[i] for i in keep], dtype=object)
+    for column in df.columns:
+        kind = GRID_SCHEMA.get(column, "text")
+        df[column] = convert_column(df[column], kind)
+    return df
+
+def load_pyarrow():
+    """Return the pyarrow module, or None when it is not installed"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:
+        return None
+    return pyarrow
+
+def sidecar_path(excel_path):
+    """The Arrow sidecar stored next to an export"""
+    return Path(excel_path).with_suffix(SIDECAR_SUFFIX)
+
+def write_sidecar(df, excel_path):
+    """Write the export as an Arrow IPC file with the grid schema attached, if pyarrow is available"""
+    pa = load_pyarrow()
+    if pa is None:
+        return None
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"grid_schema"] = json.dumps(GRID_SCHEMA).encode("utf-8")
+    metadata[b"sheet"] = EXPORT_SHEET.encode("utf-8")
+    table = table.replace_schema_metadata(metadata)
+
+    path = sidecar_path(excel_path)
+    temp_path = path.with_suffix(".tmp")
+    with pa.OSFile(str(temp_path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    temp_path.replace(path)
+    return path
+
+def read_sidecar(path):
+    """Memory-map an Arrow sidecar into a DataFrame"""
+    pa = load_pyarrow()
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas()
+
+def read_export(path):
+    """Read a scraper export, returning (DataFrame, whether its columns are already aligned)
+
+    The Arrow sidecar is used when pyarrow is installed and the sidecar is at least as new
+    as the xlsx, so an xlsx that was edited by hand still wins.
+    """
+    sidecar = sidecar_path(path)
+    if (sidecar.exists() and load_pyarrow() is not None
+            and sidecar.stat().st_mtime >= Path(path).stat().st_mtime):
+        try:
+            df = read_sidecar(sidecar)
+            print(f"Read columnar copy {sidecar}")
+            return df, True
+        except Exception as e:
+            print(f"Could not read {sidecar}, falling back to the xlsx: {e}")
+
+    with pd.ExcelFile(path) as book:
+        sheet = book.sheet_names[0]
+        df = book.parse(sheet)
+    return df, sheet == EXPORT_SHEET
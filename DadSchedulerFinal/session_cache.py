@@ -0,0 +1,105 @@
+import json
+import time
+from pathlib import Path
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from webscraper import login_to_website
+from waits import PAGE_TIMEOUT, wait_for_document_ready
+
+# Cookies are kept next to config.ini, one session_cache_<username>.json per login;
+# the files hold live credentials, never commit them
+CACHE_DIR = Path(__file__).parent
+CACHE_TTL_MINUTES = 240
+# How long the cheap "still logged in?" check waits for the welcomeUser span
+VALIDATE_TIMEOUT = 3
+
+def cache_path_for(username, root=CACHE_DIR):
+    """One cache file per login, so jobs for different accounts keep their own cookies"""
+    safe_name = "".join(c if c.isalnum() else "_" for c in username.lower())
+    return Path(root) / f"session_cache_{safe_name}.json"
+
+def is_logged_in(driver, timeout=VALIDATE_TIMEOUT):
+    """Whether the page shows the welcomeUser span, which only the logged-in pages have"""
+    try:
+        WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.ID, "welcomeUser")))
+        return True
+    except TimeoutException:
+        return False
+
+def load_session(cache_path, username):
+    """Read the cached session, returning None if it is missing, expired or for another user"""
+    try:
+        cached = json.loads(Path(cache_path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if cached.get("username") != username or cached.get("expires_at", 0) <= time.time():
+        return None
+    return cached
+
+def save_session(driver, cache_path, username, login_seconds, ttl_minutes=CACHE_TTL_MINUTES,
+                 stats=None):
+    """Write the authenticated cookies to the cache file with an expiry"""
+    now = time.time()
+    cached = {
+        "username": username,
+        "url": driver.current_url,
+        "cookies": driver.get_cookies(),
+        "saved_at": now,
+        "expires_at": now + ttl_minutes * 60,
+        "login_seconds": login_seconds,
+        "stats": stats or {"reused": 0, "seconds_saved": 0.0},
+    }
+    Path(cache_path).write_text(json.dumps(cached, indent=2), encoding="utf-8")
+
+def restore_session(driver, url, cached, page_timeout=PAGE_TIMEOUT):
+    """Load cached cookies into the browser and check that the portal still knows us"""
+    # Cookies can only be set for the domain the browser is currently on
+    driver.get(url)
+    wait_for_document_ready(driver, page_timeout)
+    driver.delete_all_cookies()
+    for cookie in cached["cookies"]:
+        cookie = dict(cookie)
+        if "expiry" in cookie:
+            cookie["expiry"] = int(cookie["expiry"])
+        try:
+            driver.add_cookie(cookie)
+        except WebDriverException as e:
+            print(f"Skipping cached cookie {cookie.get('name')}: {e}")
+
+    driver.get(cached["url"])
+    return is_logged_in(driver)
+
+def login_with_cache(driver, url, username, password, cache_path=None,
+                     ttl_minutes=CACHE_TTL_MINUTES, page_timeout=PAGE_TIMEOUT):
+    """Reuse a cached session when it is still valid, otherwise do the full login and cache it"""
+    cache_path = cache_path or cache_path_for(username)
+    cached = load_session(cache_path, username)
+    stats = cached["stats"] if cached else None
+
+    if cached:
+        start = time.perf_counter()
+        if restore_session(driver, url, cached, page_timeout):
+            restore_seconds = time.perf_counter() - start
+            saved = max(cached["login_seconds"] - restore_seconds, 0.0)
+            cached["stats"]["reused"] += 1
+            cached["stats"]["seconds_saved"] += saved
+            Path(cache_path).write_text(json.dumps(cached, indent=2), encoding="utf-8")
+            print(f"Reused cached session in {restore_seconds:.2f}s "
+                  f"(full login took {cached['login_seconds']:.2f}s, saved {saved:.2f}s; "
+                  f"{cached['stats']['seconds_saved']:.1f}s saved over "
+                  f"{cached['stats']['reused']} runs)")
+            return True
+        print("Cached session is no longer valid, logging in again")
+        driver.delete_all_cookies()
+
+    start = time.perf_counter()
+    if not login_to_website(driver, url, username, password, page_timeout):
+        return False
+    login_seconds = time.perf_counter() - start
+    save_session(driver, cache_path, username, login_seconds, ttl_minutes, stats)
+    print(f"Full login took {login_seconds:.2f}s, session cached for {ttl_minutes} minutes")
+    return True
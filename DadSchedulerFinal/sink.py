@@ -0,0 +1,99 @@
+import csv
+import json
+import os
+import time
+from pathlib import Path
+
+# A checkpoint older than this belongs to an earlier run of the day, not a crash to resume
+CHECKPOINT_TTL_MINUTES = 60
+
+class PageSink:
+    """Append-only CSV of scraped pages with a checkpoint of the last completed page
+
+    Rows are appended and flushed to disk as each page is scraped. The checkpoint records
+    the last page and the file size after it, so a crashed run can truncate any half-written
+    page and carry on from the next one. Page numbers only mean the same rows under the
+    same page size, so the checkpoint also records page_size and is only resumed by a run
+    with the same page_size within ttl_minutes of its last page.
+    """
+    def __init__(self, excel_path, page_size="", ttl_minutes=CHECKPOINT_TTL_MINUTES):
+        base = Path(excel_path)
+        self.data_path = base.with_suffix(".pages.csv")
+        self.checkpoint_path = base.with_suffix(".checkpoint.json")
+        self.page_size = page_size
+        self.ttl_minutes = ttl_minutes
+        self.checkpoint = self.load_checkpoint()
+
+    def empty_checkpoint(self):
+        return {"last_page": 0, "offset": 0, "header": None, "rows": 0,
+                "page_size": self.page_size, "saved_at": None}
+
+    def load_checkpoint(self):
+        """Read the checkpoint, discarding it if it is stale, from another page size or
+        not backed up by the data file"""
+        try:
+            checkpoint = json.loads(self.checkpoint_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return self.empty_checkpoint()
+        if checkpoint.get("page_size") != self.page_size:
+            print(f"Discarding the checkpoint: it was written with page size "
+                  f"{checkpoint.get('page_size', 'unknown')}, this run uses {self.page_size}")
+            return self.empty_checkpoint()
+        age_minutes = (time.time() - (checkpoint.get("saved_at") or 0)) / 60
+        if age_minutes > self.ttl_minutes:
+            print(f"Discarding the checkpoint: it is {age_minutes:.0f} minutes old "
+                  f"(limit {self.ttl_minutes})")
+            return self.empty_checkpoint()
+        if not self.data_path.exists() or self.data_path.stat().st_size < checkpoint["offset"]:
+            return self.empty_checkpoint()
+        return checkpoint
+
+    def resume_page(self):
+        """The page to start scraping from: 1 for a fresh run, K+1 after a checkpoint at K"""
+        if self.checkpoint["last_page"]:
+            print(f"Resuming after page {self.checkpoint['last_page']} "
+                  f"({self.checkpoint['rows']} rows already on disk)")
+        # Drop anything written after the last checkpoint
+        with open(self.data_path, "a+b") as f:
+            f.truncate(self.checkpoint["offset"])
+        return self.checkpoint["last_page"] + 1
+
+    def write_checkpoint(self):
+        temp_path = self.checkpoint_path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(self.checkpoint), encoding="utf-8")
+        os.replace(temp_path, self.checkpoint_path)
+
+    def on_page(self, page_number, page_data):
+        """scrape_all_pages callback: append the page's rows and move the checkpoint"""
+        if not page_data:
+            return True
+        if self.checkpoint["header"] is None:
+            self.checkpoint["header"] = page_data[0]
+
+        with open(self.data_path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerows(page_data[1:])
+            f.flush()
+            os.fsync(f.fileno())
+        offset = self.data_path.stat().st_size
+
+        self.checkpoint.update({"last_page": page_number, "offset": offset,
+                                "rows": self.checkpoint["rows"] + len(page_data) - 1,
+                                "saved_at": time.time()})
+        self.write_checkpoint()
+        return True
+
+    def read_all(self):
+        """Assemble all_data (header row first) from the sink"""
+        if self.checkpoint["header"] is None:
+            return []
+        all_data = [self.checkpoint["header"]]
+        with open(self.data_path, newline="", encoding="utf-8") as f:
+            all_data.extend(csv.reader(f))
+        return all_data
+
+    def clear(self):
+        """Remove the sink once the final export has been written"""
+        for path in (self.data_path, self.checkpoint_path):
+            if path.exists():
+                path.unlink()
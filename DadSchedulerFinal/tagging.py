@@ -0,0 +1,93 @@
+"""Keyword rules that tag report rows from their comments.
+
+Each KeywordRule looks for a keyword (or a regex) in a source column and appends its tag
+to a target column. The rules are compiled once: one combined regex finds the rows that
+match any rule in a single pass over the column, and only those rows are checked rule by
+rule, so a row can pick up several tags. Keywords match whole words by default, so "MT"
+tags "MT to ride along" but not "APPOINTMENT" or "EMT".
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+class KeywordRule:
+    """Append tag to target wherever source matches keyword
+
+    whole_word=False also matches inside longer words, prefix=True matches words that
+    start with the keyword ("MONITOR" in "MONITORED"), and regex=True uses keyword as a
+    regular expression as is. Matching ignores case unless case=True.
+    """
+    def __init__(self, keyword, tag, target="Name", source="Comments", whole_word=True,
+                 prefix=False, regex=False, case=False):
+        self.keyword = keyword
+        self.tag = tag
+        self.target = target
+        self.source = source
+        self.case = case
+        if regex:
+            self.pattern = keyword
+        else:
+            self.pattern = re.escape(keyword)
+            if whole_word or prefix:
+                self.pattern = r"\b" + self.pattern + ("" if prefix else r"\b")
+
+    def compile(self):
+        return re.compile(self.pattern, 0 if self.case else re.IGNORECASE)
+
+class TagRules:
+    """A rule table compiled for tagging whole DataFrames"""
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.sources = {}
+        for rule in self.rules:
+            self.sources.setdefault(rule.source, []).append(rule)
+        # One alternation per source column finds the rows any rule applies to
+        self.combined = {
+            source: re.compile("|".join(f"(?:{rule.pattern})" for rule in rules),
+                               0 if all(rule.case for rule in rules) else re.IGNORECASE)
+            for source, rules in self.sources.items()
+        }
+        self.compiled = [(rule, rule.compile()) for rule in self.rules]
+
+    def tags(self, df):
+        """Return {target column: Series of " tag" suffixes} for the rows that match, in rule order"""
+        suffixes = {}
+        # (target, tag) -> rows already given that tag, so two rules with the same tag
+        # (MONITOR and MT) tag a row once while "*monitor" and "*monitored" stay distinct
+        applied = {}
+        for source, combined in self.combined.items():
+            if source not in df.columns:
+                continue
+            text = df[source].fillna("").astype(str)
+            rows = np.flatnonzero(text.str.contains(combined).to_numpy(dtype=bool))
+            if not len(rows):
+                continue
+            candidates = text.iloc[rows]
+            for rule, compiled in self.compiled:
+                if rule.source != source:
+                    continue
+                matched = rows[candidates.str.contains(compiled).to_numpy(dtype=bool)]
+                suffix = suffixes.setdefault(rule.target, np.full(len(df), "", dtype=object))
+                tagged = applied.setdefault((rule.target, rule.tag), np.zeros(len(df), dtype=bool))
+                new = matched[~tagged[matched]]
+                suffix[new] = suffix[new] + " " + rule.tag
+                tagged[new] = True
+        return {target: pd.Series(suffix, index=df.index) for target, suffix in suffixes.items()}
+
+    def apply(self, df, counts=None):
+        """Append the matching tags to their target columns of df, returning df
+
+        counts, when given, is filled with the number of rows tagged per target column.
+        """
+        for target, suffix in self.tags(df).items():
+            tagged = (suffix != "").to_numpy()
+            if counts is not None:
+                counts[target] = int(tagged.sum())
+            if target not in df.columns:
+                df[target] = ""
+                df.loc[tagged, target] = suffix[tagged].str.lstrip()
+                continue
+            df[target] = df[target].astype(object)
+            df.loc[tagged, target] = df.loc[tagged, target].astype(str) + suffix[tagged]
+        return df
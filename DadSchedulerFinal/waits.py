@@ -0,0 +1,113 @@
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import (TimeoutException, NoSuchElementException,
+                                        StaleElementReferenceException)
+import hashlib
+import re
+
+from locators import registry
+
+# Default wait settings, overridable from the [waits] section of config.ini
+PAGE_TIMEOUT = 15
+POLL_INTERVAL = 0.1
+
+# Default page retry settings, overridable from the [retry] section of config.ini
+PAGE_RETRIES = 3
+BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+
+# Returns the grid's rendered text so it can be fingerprinted in one call
+GRID_TEXT_SCRIPT = """
+var grid = document.getElementById('grid_MainDataGrid');
+return grid ? grid.innerText : null;
+"""
+
+class PageNotAdvancedError(TimeoutException):
+    """Raised when a postback finished waiting but the page never changed"""
+
+class PaginationError(Exception):
+    """Raised when the grid could not be moved or read, as opposed to being on its last page"""
+
+def backoff_delay(attempt, base=BACKOFF_SECONDS, cap=MAX_BACKOFF_SECONDS):
+    """Seconds to wait before retry number attempt (1, 2, 3, ...): base, 2x base, 4x base, ..."""
+    return min(base * 2 ** (attempt - 1), cap)
+
+def wait_for_document_ready(driver, timeout=PAGE_TIMEOUT, poll=POLL_INTERVAL):
+    """Wait until the document is parsed (the lean profile does not wait for subresources)"""
+    WebDriverWait(driver, timeout, poll_frequency=poll).until(
+        lambda d: d.execute_script("return document.readyState") in ("interactive", "complete")
+    )
+
+def find_grid(driver):
+    """Return the grid element, or None when it is not on the page"""
+    grids = driver.find_elements(By.ID, "grid_MainDataGrid")
+    return grids[0] if grids else None
+
+def parse_page_indicator(element):
+    """Turn a "Page X of Y" element into (X, Y), or None if it is something else"""
+    numbers = [int(n) for n in re.findall(r'\d+', element.text)]
+    if len(numbers) >= 2:
+        return numbers[0], numbers[1]
+    return None
+
+def read_page_indicator(driver):
+    """Read the "Page X of Y" text, returning (current, total) or None"""
+    return registry.first_match(driver, "page_indicator", parse_page_indicator)
+
+def grid_fingerprint(driver):
+    """Hash the grid's visible text, or None when there is no grid"""
+    text = driver.execute_script(GRID_TEXT_SCRIPT)
+    if text is None:
+        return None
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def capture_page_state(driver):
+    """Snapshot the grid element, page indicator and grid fingerprint"""
+    return {
+        "grid": find_grid(driver),
+        "page": read_page_indicator(driver),
+        "fingerprint": grid_fingerprint(driver),
+    }
+
+def is_stale(element):
+    """Check whether an element has been detached from the document"""
+    try:
+        element.is_enabled()
+        return False
+    except StaleElementReferenceException:
+        return True
+
+def page_changed(driver, before):
+    """Check whether a new grid page has rendered since the before snapshot"""
+    try:
+        grid = find_grid(driver)
+        if grid is None:
+            return False
+
+        # The old grid was replaced by the postback
+        if before["grid"] is None or is_stale(before["grid"]):
+            return True
+
+        # The "Page X of Y" text moved on
+        page = read_page_indicator(driver)
+        if page is not None and before["page"] is not None and page != before["page"]:
+            return True
+
+        # The grid was updated in place
+        return grid_fingerprint(driver) != before["fingerprint"]
+    except StaleElementReferenceException:
+        # Caught the DOM mid-update, poll again
+        return False
+
+def wait_for_page_change(driver, before, timeout=PAGE_TIMEOUT, poll=POLL_INTERVAL):
+    """Wait until the page differs from the before snapshot and return the new state"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll,
+                      ignored_exceptions=[NoSuchElementException]).until(
+            lambda d: page_changed(d, before)
+        )
+    except TimeoutException:
+        raise PageNotAdvancedError(
+            f"Page did not change within {timeout}s (was page {before['page']})"
+        )
+    return capture_page_state(driver)
@@ -3,16 +3,23 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support.ui import Select, WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-import pandas as pd
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 import time
 import os
+import sys
 from datetime import datetime, timedelta
 import re
 import configparser
 from pathlib import Path
+from locators import registry
+from diagnostics import diagnostics
+from metrics import metrics, span
+from schema import DATE_FORMAT, EXPORT_SHEET, typed_frame, write_sidecar
+from waits import (PAGE_TIMEOUT, POLL_INTERVAL, PAGE_RETRIES, BACKOFF_SECONDS,
+                   PageNotAdvancedError, PaginationError, backoff_delay, capture_page_state,
+                   find_grid, read_page_indicator, wait_for_document_ready, wait_for_page_change)
 
 def load_config():
     """Load configuration from config.ini file"""
@@ -27,173 +34,323 @@ def load_config():
     config.read(config_path)
     return config
 
-def setup_driver():
-    """Set up the Chrome WebDriver with appropriate options"""
+# Optional config.ini settings: name -> (section, default). The default's type decides how
+# the value is parsed, so a missing section or option simply keeps the default.
+SETTINGS = {
+    "backend": ("scraper", "browser"),
+    "parallel_sessions": ("scraper", 1),
+    "bulk_extraction": ("scraper", True),
+    "compare_extraction": ("scraper", False),
+    "incremental": ("scraper", False),
+    "stop_on_unchanged_page": ("scraper", False),
+    "checkpoint": ("scraper", True),
+    "checkpoint_ttl_minutes": ("scraper", 60),
+    "tab": ("scraper", ""),
+    "capture": ("scraper", False),
+    "max_page_size": ("scraper", True),
+    "profile": ("driver", "full"),
+    "headless": ("driver", ""),
+    "page_timeout": ("waits", float(PAGE_TIMEOUT)),
+    "debug": ("diagnostics", False),
+    "ring_size": ("diagnostics", 20),
+    "poll_interval": ("waits", POLL_INTERVAL),
+    "session_cache": ("session", True),
+    "session_ttl_minutes": ("session", 240),
+    "page_retries": ("retry", PAGE_RETRIES),
+    "backoff_seconds": ("retry", BACKOFF_SECONDS),
+}
+
+def load_settings(config, overrides=None):
+    """Read the optional scraper settings from config, falling back to the defaults
+    
+    Settings also present in the overrides section (a [job:<name>]) are read from there.
+    """
+    settings = {}
+    for name, (section, default) in SETTINGS.items():
+        if overrides and config.has_option(overrides, name):
+            section = overrides
+        if isinstance(default, bool):
+            value = config.getboolean(section, name, fallback=default)
+        elif isinstance(default, int):
+            value = config.getint(section, name, fallback=default)
+        elif isinstance(default, float):
+            value = config.getfloat(section, name, fallback=default)
+        else:
+            value = config.get(section, name, fallback=default).strip().lower()
+        settings[name] = value
+    return settings
+
+# Resources the lean profile never downloads. Only the requests are blocked, the <img src>
+# attributes stay in the DOM so the red car and next-page locators still match.
+LEAN_BLOCKED_URLS = ["*.gif", "*.png", "*.jpg", "*.jpeg", "*.ico", "*.svg",
+                     "*.css", "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"]
+
+# Blocked images would collapse to 0x0 and stop being clickable, so keep them a click target
+LEAN_IMAGE_SIZE_SCRIPT = """
+document.addEventListener('DOMContentLoaded', function () {
+    var style = document.createElement('style');
+    style.textContent = 'img { min-width: 16px; min-height: 16px; display: inline-block; }';
+    document.head.appendChild(style);
+});
+"""
+
+def setup_driver(profile="full", headless=None, capture=False):
+    """Set up the Chrome WebDriver with appropriate options
+    
+    profile "full" renders the portal like a normal browser window. profile "lean" runs
+    headless with an eager page-load strategy and blocks images, fonts and CSS through CDP.
+    capture logs network events so the grid can be read from the postback responses.
+    """
     chrome_options = Options()
-    chrome_options.add_argument("--start-maximized")  # Start with maximized browser
+    lean = profile == "lean"
+    if headless is None:
+        headless = lean
+    
+    if headless:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--window-size=1920,1080")
+    else:
+        chrome_options.add_argument("--start-maximized")  # Start with maximized browser
+    
+    if lean:
+        # Hand control back at DOMContentLoaded; our waits cover the rest
+        chrome_options.page_load_strategy = "eager"
+        chrome_options.add_argument("--disable-extensions")
     
-    # Optional: Uncomment to run in headless mode (no browser UI)
-    # chrome_options.add_argument("--headless")
+    if capture:
+        from capture import enable_network_log
+        enable_network_log(chrome_options)
     
     # Set up driver - update the path to your chromedriver if needed
     driver = webdriver.Chrome(options=chrome_options)
+    
+    if lean:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": LEAN_BLOCKED_URLS})
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument",
+                               {"source": LEAN_IMAGE_SIZE_SCRIPT})
     return driver
 
-def login_to_website(driver, url, username, password):
+def login_to_website(driver, url, username, password, page_timeout=PAGE_TIMEOUT):
     """Login to the website with provided credentials"""
     print(f"Opening website: {url}")
+    started = time.perf_counter()
     driver.get(url)
     
     # Wait for the page to load
-    time.sleep(2)
+    wait_for_document_ready(driver, page_timeout)
     
     try:
-        # Try different possible selectors for username field
-        username_selectors = [
-            #(By.ID, "User ID"),
-            #(By.NAME, "UserName"),
-            #(By.NAME, "userid"),
-            (By.XPATH, "//input[@type='text' and contains(@name, 'UserName')]"),
-            (By.XPATH, "//input[@name='UserName' and contains(@id, 'UserName')]")
-        ]
-        
-        username_field = None
-        for selector in username_selectors:
-            try:
-                username_field = WebDriverWait(driver, 5).until(
-                    EC.presence_of_element_located(selector)
-                )
-                if username_field:
-                    break
-            except:
-                continue
-                
-        if not username_field:
-            raise NoSuchElementException("Could not find username field")
-            
+        # The locator registry tries the candidate that worked last time first
+        username_field = registry.find(driver, "username", 5)
         username_field.clear()
         username_field.send_keys(username)
         print("Username entered")
         
-        # Try different possible selectors for password field
-        password_selectors = [
-            #(By.ID, "Password"),
-            (By.NAME, "Password"),
-            (By.XPATH, "//input[@type='password']")
-        ]
-        
-        password_field = None
-        for selector in password_selectors:
-            try:
-                password_field = WebDriverWait(driver, 5).until(
-                    EC.presence_of_element_located(selector)
-                )
-                if password_field:
-                    break
-            except:
-                continue
-                
-        if not password_field:
-            raise NoSuchElementException("Could not find password field")
-            
+        password_field = registry.find(driver, "password", 5)
         password_field.clear()
         password_field.send_keys(password)
         print("Password entered")
         
-        # Try different possible selectors for login button
-        login_button_selectors = [
-            (By.XPATH, "//input[@type='submit']"),
-            #(By.XPATH, "//button[contains(text(), 'Login')]"),
-            (By.XPATH, "//input[@name='Submit']"),
-            #(By.XPATH, "//button[@type='submit']")
-        ]
-        
-        login_button = None
-        for selector in login_button_selectors:
-            try:
-                login_button = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable(selector)
-                )
-                if login_button:
-                    break
-            except:
-                continue
-                
-        if not login_button:
-            raise NoSuchElementException("Could not find login button")
-            
+        login_button = registry.find(driver, "login_button", 5, EC.element_to_be_clickable)
         login_button.click()
         print("Login button clicked")
         
         # Wait for successful login - try different possible success indicators
-        success_indicators = [
-            (By.XPATH, "//td[contains(text(), 'ITMS Vendor Portal')]"),
-            (By.XPATH, "//span[contains(text(), 'Welcome REMT !')]"),
-            (By.XPATH, "//span[@id='welcomeUser']"),
-            #(By.XPATH, "//div[contains(text(), 'Logout')]")
-        ]
-        
-        success = False
-        for indicator in success_indicators:
-            try:
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located(indicator)
-                )
-                success = True
-                break
-            except:
-                continue
-                
-        if not success:
+        try:
+            registry.find(driver, "login_success", 10)
+        except NoSuchElementException:
             raise TimeoutException("Could not verify successful login")
             
         print("Successfully logged in")
+        diagnostics.record("login", driver, time.perf_counter() - started)
         return True
         
     except (TimeoutException, NoSuchElementException) as e:
         print(f"Error during login: {e}")
-        # Take a screenshot for debugging
-        driver.save_screenshot("login_error.png")
-        print("Screenshot saved as login_error.png")
+        diagnostics.failure("login", driver, e, started)
         return False
 
-def click_red_car_icon(driver):
-    """Click on the red car picture to download data - visible in Image 2"""
+def click_red_car_icon(driver, page_timeout=PAGE_TIMEOUT, poll=POLL_INTERVAL, tab="",
+                       max_page_size=True):
+    """Click on the red car picture to download data - visible in Image 2
+    
+    tab is the image name of the grid tab to open, the MH Trips tab when empty. With
+    max_page_size the grid is switched to its largest page size before returning.
+    """
+    started = time.perf_counter()
     try:
         # From Image 2, there's a red car icon with text "Download today's Trips/Set Rates/Generate Invoices"
-        red_car = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//img[contains(@src, 'images/DownloadTrips.gif')]"))
-        )
-        # Alternative XPATH based on the surrounding text
-        if not red_car:
-            red_car = driver.find_element(By.XPATH, "//*[contains(text(), 'Download today's Trips/Set Rates/Generate Invoices')]")
-        
+        red_car = registry.find(driver, "red_car", 10, EC.element_to_be_clickable)
         red_car.click()
         print("Clicked on red car icon")
         
         # Wait for data page to load - based on Image 3, we're looking for the "MH Trips" tab
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//img[contains(@src, '/ITMSVP/images/tabTripsOnMART.gif')]"))
-        )
+        trips_tab = registry.find(driver, registry.tab(tab), 10)
         
-        # Make sure we're on the Trips tab (Image 3 shows we need to be on MH Trips)
-        trips_tab = driver.find_element(By.XPATH, "//img[contains(@src, '/ITMSVP/images/tabTripsOnMART.gif')]")
-        if '/ITMSVP/images/tabTripsOnMART.gif' in trips_tab.text:
+        # The menu page has no grid, so a grid here means MH Trips is already open and
+        # clicking it again may not post back. Another tab is always clicked, like the
+        # HTTP backend does, as the grid showing may be MH Trips
+        if not tab and find_grid(driver) is not None:
             print("Already on MH Trips tab")
         else:
+            before = capture_page_state(driver)
             trips_tab.click()
-            print("Clicked on MH Trips tab")
-            time.sleep(2)
+            print(f"Clicked on {tab or 'MH Trips'} tab")
+            # Return as soon as the trips grid has rendered
+            wait_for_page_change(driver, before, page_timeout, poll)
+        
+        if max_page_size:
+            maximize_page_size(driver, page_timeout, poll)
         
+        diagnostics.record("open_trips", driver, time.perf_counter() - started)
         return True
         
     except (TimeoutException, NoSuchElementException) as e:
         print(f"Error clicking red car icon: {e}")
+        diagnostics.failure("open_trips", driver, e, started)
+        return False
+
+# Page-size option labels that put the whole grid on one page
+SHOW_ALL_LABELS = {"all", "show all", "view all"}
+
+def largest_page_size(options):
+    """Pick the option that shows the most rows from (value, label) pairs, None if none is a size"""
+    best, best_size = None, 0
+    for value, label in options:
+        text = " ".join((label or "").split()).lower()
+        if text in SHOW_ALL_LABELS:
+            return value
+        digits = re.sub(r"\D", "", text) or re.sub(r"\D", "", value or "")
+        if digits and int(digits) > best_size:
+            best, best_size = value, int(digits)
+    return best
+
+def maximize_page_size(driver, page_timeout=PAGE_TIMEOUT, poll=POLL_INTERVAL):
+    """Switch the grid to its largest page size (or "show all") so there are fewer pages to click
+    
+    Returns True when the page size changed. Without a page-size control, or when choosing
+    a size does not post back, the grid keeps the page size it has.
+    """
+    try:
+        # The grid has already rendered, so the control is either there or not: no waiting
+        control = registry.first_match(driver, "page_size", lambda element: element)
+        if control is not None:
+            select = Select(control)
+            value = largest_page_size([(option.get_attribute("value"), option.text)
+                                       for option in select.options])
+            if value is None or select.first_selected_option.get_attribute("value") == value:
+                return False
+            before = capture_page_state(driver)
+            select.select_by_value(value)
+        else:
+            show_all = registry.first_match(driver, "show_all", lambda element: element)
+            if show_all is None:
+                print("No page-size control on the grid, keeping its page size")
+                return False
+            before = capture_page_state(driver)
+            show_all.click()
+        state = wait_for_page_change(driver, before, page_timeout, poll)
+    except (PageNotAdvancedError, WebDriverException) as e:
+        print(f"Could not change the grid's page size, keeping it: {e}")
         return False
+    
+    pages = state["page"][1] if state["page"] else 1
+    print(f"Switched the grid to its largest page size ({pages} {'page' if pages == 1 else 'pages'})")
+    return True
 
-def scrape_table_data(driver):
+# Cell classes that mark the data cells we want to keep from each grid row
+DATA_CELL_CLASSES = ["DataGrid-ItemStyle-ControlColumn",
+                     "aspNetDisabled DataGrid-ItemStyle-ControlColumn",
+                     "DataGrid-ItemStyle"]
+
+# Pulls every row of the grid as [[class, text], ...] in a single WebDriver call
+GRID_EXTRACT_SCRIPT = """
+var grid = document.getElementById('grid_MainDataGrid');
+if (!grid) { return null; }
+var rows = grid.querySelectorAll(':scope > tbody > tr');
+var result = [];
+for (var i = 0; i < rows.length; i++) {
+    var cells = rows[i].querySelectorAll('td');
+    var rowData = [];
+    for (var j = 0; j < cells.length; j++) {
+        rowData.push([cells[j].className || '', cells[j].innerText || '']);
+    }
+    result.push(rowData);
+}
+return result;
+"""
+
+def is_data_cell(cell_class):
+    """Check if a cell class belongs to the data structure we want"""
+    return any(cls in (cell_class or "") for cls in DATA_CELL_CLASSES)
+
+def position_rows(header_count, grid_rows):
+    """Line each row's cells up under the headers, with None for blank and non-data cells
+    
+    grid_rows are lists of (cell class, text). Keeping the blank cells in place means the
+    columns never shift, so cleanup has nothing to realign. Rows without any data cell
+    (pager rows) are skipped.
+    """
+    rows_data = []
+    for row in grid_rows:
+        if not any(is_data_cell(cell_class) for cell_class, _ in row):
+            continue
+        values = [((text or "").strip() or None) if is_data_cell(cell_class) else None
+                  for cell_class, text in row]
+        rows_data.append(values + [None] * (header_count - len(values)))
+    return rows_data
+
+def extract_grid_per_cell(driver):
+    """Read the grid one element at a time (one WebDriver call per cell)"""
+    headers = []
+    # Get all header cells using the provided XPath
+    header_cells = driver.find_elements(By.XPATH, "//*[@id='grid_MainDataGrid']/tbody/tr[1]/td")
+    for cell in header_cells:
+        headers.append(cell.text.strip())
+    
+    grid_rows = []
+    # Get all rows except the header row
+    rows = driver.find_elements(By.XPATH, "//*[@id='grid_MainDataGrid']/tbody/tr[position()>1]")
+    for row in rows:
+        # Get all cells in the row, including empty ones, with the class that identifies its type
+        cells = row.find_elements(By.XPATH, ".//td")
+        grid_rows.append([(cell.get_attribute("class"), cell.text) for cell in cells])
+    
+    return headers, position_rows(len(headers), grid_rows)
+
+def extract_grid_bulk(driver):
+    """Read the whole grid with a single execute_script round trip"""
+    grid_rows = driver.execute_script(GRID_EXTRACT_SCRIPT)
+    if not grid_rows:
+        return [], []
+    
+    headers = [text.strip() for _, text in grid_rows[0]]
+    return headers, position_rows(len(headers), grid_rows[1:])
+
+def compare_extraction(driver):
+    """Time the bulk and per-cell extraction paths on the current page"""
+    start = time.perf_counter()
+    per_cell = extract_grid_per_cell(driver)
+    per_cell_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    bulk = extract_grid_bulk(driver)
+    bulk_seconds = time.perf_counter() - start
+    
+    speedup = per_cell_seconds / bulk_seconds if bulk_seconds else float("inf")
+    print(f"Per-cell extraction: {per_cell_seconds:.3f}s, bulk extraction: {bulk_seconds:.3f}s "
+          f"({speedup:.1f}x faster, {len(bulk[1])} rows)")
+    if per_cell != bulk:
+        print("Warning: bulk and per-cell extraction returned different data")
+    
+    return {"per_cell_seconds": per_cell_seconds, "bulk_seconds": bulk_seconds,
+            "speedup": speedup, "rows": len(bulk[1]), "matches": per_cell == bulk}
+
+def scrape_table_data(driver, bulk=True):
     """Scrape data from the current page by selecting all rows"""
     all_data = []
+    started = time.perf_counter()
     
     try:
         # Wait for the table to be visible
@@ -203,13 +360,13 @@ def scrape_table_data(driver):
         )
         print("Table found")
         
-        # Get the table headers
-        print("Getting table headers...")
-        headers = []
-        # Get all header cells using the provided XPath
-        header_cells = driver.find_elements(By.XPATH, "//*[@id='grid_MainDataGrid']/tbody/tr[1]/td")
-        for cell in header_cells:
-            headers.append(cell.text.strip())
+        # Get the table headers and rows, in one round trip when bulk mode is on
+        start = time.perf_counter()
+        if bulk:
+            headers, rows = extract_grid_bulk(driver)
+        else:
+            headers, rows = extract_grid_per_cell(driver)
+        elapsed = time.perf_counter() - start
         
         print(f"Found {len(headers)} headers: {headers}")
         
@@ -217,170 +374,523 @@ def scrape_table_data(driver):
         if headers:
             all_data.append(headers)
         
-        # Get all data rows from the table
-        print("Getting table rows...")
-        # Get all rows except the header row
-        rows = driver.find_elements(By.XPATH, "//*[@id='grid_MainDataGrid']/tbody/tr[position()>1]")
+        # Add the row data, even if empty, to maintain table structure
         print(f"Found {len(rows)} rows")
+        all_data.extend(rows)
         
-        for row in rows:
-            # Get all cells in the row, including empty ones
-            cells = row.find_elements(By.XPATH, ".//td")
-            row_data = []
-            for cell in cells:
-                # Get the cell's class to identify its type
-                cell_class = cell.get_attribute("class")
-                # Check if cell is part of the data structure we want
-                if any(cls in cell_class for cls in ["DataGrid-ItemStyle-ControlColumn", 
-                                                   "aspNetDisabled DataGrid-ItemStyle-ControlColumn", 
-                                                   "DataGrid-ItemStyle"]):
-                    row_data.append(cell.text.strip())
-            
-            # Add the row data, even if empty, to maintain table structure
-            all_data.append(row_data)
-        
-        print(f"Scraped {len(all_data) - 1} rows of data")  # Subtract 1 for header row
+        mode = "bulk" if bulk else "per-cell"
+        print(f"Scraped {len(rows)} rows of data in {elapsed:.2f}s ({mode} extraction)")
         
-        # Take a screenshot of the table for debugging
-        driver.save_screenshot("table_scrape.png")
-        print("Screenshot saved as table_scrape.png")
+        # Keep the page's URL, grid HTML and timing in case a later step fails
+        diagnostics.record("scrape_page", driver, time.perf_counter() - started)
         
         return all_data
         
     except (TimeoutException, NoSuchElementException) as e:
         print(f"Error scraping data: {e}")
-        # Take a screenshot when error occurs
-        driver.save_screenshot("table_error.png")
-        print("Error screenshot saved as table_error.png")
+        diagnostics.failure("scrape_page", driver, e, started)
         return []
 
-def go_to_next_page(driver):
-    """Click on the next arrow to go to the next page"""
+def go_to_next_page(driver, page_timeout=PAGE_TIMEOUT, poll=POLL_INTERVAL):
+    """Click on the next arrow to go to the next page
+    
+    Returns True once the next page has rendered and False on the last page. A failed move
+    raises PaginationError, so a timeout is never mistaken for the end of the grid.
+    """
+    started = time.perf_counter()
     try:
         # Wait for the page info to be visible
-        page_info = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//*[contains(text(), 'Page')]"))
-        ).text
-        
-        current_page, total_pages = map(int, re.findall(r'\d+', page_info))
+        try:
+            current_page, total_pages = WebDriverWait(driver, 10, poll_frequency=poll).until(
+                read_page_indicator
+            )
+        except TimeoutException:
+            if find_grid(driver) is not None:
+                # Single-page grids have no page indicator
+                print("No page indicator, the grid has a single page")
+                return False
+            raise
         
         if current_page >= total_pages:
             print("No more pages available")
             return False
             
         # Look for the next page button
-        next_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//img[contains(@src, 'arwSmallDownOn.gif')]"))
-        )
+        next_button = registry.find(driver, "next_page", 10, EC.element_to_be_clickable)
         
+        before = capture_page_state(driver)
         next_button.click()
-        print(f"Navigated to page {current_page + 1} of {total_pages}")
-        time.sleep(2)  # Wait for page to load
+        
+        # Wait for the postback to render the next page instead of a fixed sleep
+        start = time.perf_counter()
+        wait_for_page_change(driver, before, page_timeout, poll)
+        print(f"Navigated to page {current_page + 1} of {total_pages} "
+              f"in {time.perf_counter() - start:.2f}s")
+        diagnostics.record(f"next_page_{current_page + 1}", driver, time.perf_counter() - started)
         return True
         
+    except PageNotAdvancedError as e:
+        print(f"Page never advanced after clicking next: {e}")
+        diagnostics.failure("next_page", driver, e, started)
+        raise PaginationError(f"page never advanced after clicking next: {e}") from e
     except (TimeoutException, NoSuchElementException) as e:
         print(f"Error navigating to next page: {e}")
-        return False
+        diagnostics.failure("next_page", driver, e, started)
+        raise PaginationError(f"could not navigate to the next page: {e}") from e
 
-def save_data_to_excel(all_data, filepath):
-    """Save the collected data to an Excel file"""
+def go_to_page(driver, target_page, page_timeout=PAGE_TIMEOUT, poll=POLL_INTERVAL):
+    """Move the grid forward to target_page, returning False if it cannot get there"""
+    while True:
+        indicator = read_page_indicator(driver)
+        if indicator is None:
+            # Single-page grids have no page indicator
+            return target_page == 1
+        
+        current_page, total_pages = indicator
+        if current_page == target_page:
+            return True
+        if target_page < current_page or target_page > total_pages:
+            # The pager only moves forward, the caller has to reopen the grid
+            return False
+        
+        # Jump straight to the page when the pager has a numbered link for it
+        page_links = driver.find_elements(
+            By.XPATH, f"//a[normalize-space(text())='{target_page}' and contains(@href, '__doPostBack')]"
+        )
+        if page_links:
+            before = capture_page_state(driver)
+            page_links[0].click()
+            wait_for_page_change(driver, before, page_timeout, poll)
+            print(f"Jumped to page {target_page} of {total_pages}")
+        elif not go_to_next_page(driver, page_timeout, poll):
+            return False
+
+def export_data(all_data, filepath, allow_empty=False):
+    """Save the collected data to an Excel file, returning its DataFrame or None on failure
+    
+    With allow_empty a grid with headers but no rows is saved as a header-only export.
+    """
     try:
         # Convert data to pandas DataFrame
-        if all_data and len(all_data) > 1:  # Check if data exists and has at least one row plus headers
-            headers = all_data[0]
-            data = all_data[1:]
-            
-            # Remove any empty columns
-            headers = [h for h in headers if h]
-            data = [[cell for cell in row if cell] for row in data]
-            
-            # Create DataFrame
-            df = pd.DataFrame(data)
-            
-            # If the DataFrame has the right number of columns, assign headers
-            if len(headers) == len(df.columns):
-                df.columns = headers
+        if all_data and (len(all_data) > 1 or allow_empty):  # Check if data exists and has at least one row plus headers
+            # Cells stay under their headers with blanks as nulls, typed per GRID_SCHEMA
+            df = typed_frame(all_data[0], all_data[1:])
             
-            # Save to Excel
-            df.to_excel(filepath, index=False)
+            # Save to Excel; the sheet name tells cleanup the columns are already aligned
+            df.to_excel(filepath, index=False, sheet_name=EXPORT_SHEET)
             print(f"Data saved to {filepath}")
-            return True
+            
+            # Columnar copy for cleanup, written after the xlsx so it is never older. It is
+            # optional: cleanup reads the xlsx when it is missing or older
+            try:
+                sidecar = write_sidecar(df, filepath)
+                if sidecar:
+                    print(f"Columnar copy saved to {sidecar}")
+            except Exception as e:
+                print(f"Warning: could not write the columnar copy, cleanup will read the xlsx: {e}")
+            return df
         else:
             print("No data to save")
-            return False
+            return None
             
     except Exception as e:
         print(f"Error saving data to Excel: {e}")
+        return None
+
+def save_data_to_excel(all_data, filepath):
+    """Save the collected data to an Excel file"""
+    return export_data(all_data, filepath) is not None
+
+def merge_page_data(all_data, page_data):
+    """Add a scraped page to all_data, keeping the header row only once"""
+    if not all_data:
+        # Add headers only from the first page
+        all_data.extend(page_data)
+    elif page_data and len(page_data) > 1:
+        # Skip headers for subsequent pages
+        all_data.extend(page_data[1:])
+    return all_data
+
+def chain_page_callbacks(*callbacks):
+    """Combine on_page callbacks into one that stops paging if any of them asks to"""
+    callbacks = [callback for callback in callbacks if callback]
+    if not callbacks:
+        return None
+    def on_page(page_number, page_data):
+        results = [callback(page_number, page_data) for callback in callbacks]
+        return all(result is not False for result in results)
+    return on_page
+
+def open_trips_grid(driver, url, username, password, page_timeout=PAGE_TIMEOUT, poll=POLL_INTERVAL,
+                    tab="", max_page_size=True):
+    """Log a session in from scratch and open the trips grid on page 1"""
+    # Dropping the cookies sends the portal back to the login form
+    driver.delete_all_cookies()
+    if not login_to_website(driver, url, username, password, page_timeout):
         return False
+    return click_red_car_icon(driver, page_timeout, poll, tab, max_page_size)
 
-def main():
+def recover_page(driver, page, settings, reopen=None):
+    """Put the grid back on page, opening it again from the login if the session is gone"""
+    page_timeout, poll = settings["page_timeout"], settings["poll_interval"]
     try:
-        # Load configuration
-        config = load_config()
-        
-        # Get credentials from config
-        url = config['credentials']['url']
-        username = config['credentials']['username']
-        password = config['credentials']['password']
-        
-        # Setup Chrome driver
-        driver = setup_driver()
-        
+        if find_grid(driver) is not None and go_to_page(driver, page, page_timeout, poll):
+            return True
+    except (PaginationError, WebDriverException) as e:
+        print(f"Could not return to page {page} in place: {e}")
+    if reopen is None:
+        return False
+    
+    # Expired session or lost place: log in again and go straight back to the page
+    print(f"Re-opening the grid at page {page}")
+    try:
+        return reopen(driver) and go_to_page(driver, page, page_timeout, poll)
+    except (PaginationError, WebDriverException) as e:
+        print(f"Could not re-open the grid at page {page}: {e}")
+        return False
+
+def retry_page(action, page, driver, settings, reopen=None, retried=None):
+    """Run action() for page, retrying with exponential backoff after putting the grid back on page
+    
+    retried collects {page: retries} for the end-of-run summary. Raises PaginationError
+    once the retries are used up.
+    """
+    retries = settings["page_retries"]
+    for attempt in range(1, retries + 2):
         try:
-            # Login to website
-            if not login_to_website(driver, url, username, password):
-                print("Login failed. Exiting.")
-                driver.quit()
-                return
-            
-            # Click on red car icon from the main page (Image 2)
-            if not click_red_car_icon(driver):
-                print("Failed to access data through red car icon. Exiting.")
-                driver.quit()
-                return
-            
-            # Initialize all_data list to store data from all pages
-            all_data = []
-            
-            # Handle pagination and scrape data
-            has_more_pages = True
-            page_count = 1
-            
+            return action()
+        except (PaginationError, WebDriverException) as e:
+            if attempt > retries:
+                raise PaginationError(f"page {page} failed after {attempt} attempts: {e}") from e
+            delay = backoff_delay(attempt, settings["backoff_seconds"])
+            print(f"Page {page} failed ({e}), retrying in {delay:.1f}s "
+                  f"(retry {attempt} of {retries})")
+            if retried is not None:
+                retried[page] = attempt
+            time.sleep(delay)
+            recover_page(driver, page, settings, reopen)
+
+def scrape_all_pages(driver, settings, on_page=None, start_page=1, keep_data=True, reopen=None):
+    """Scrape every grid page, starting from the page the driver is on
+    
+    on_page(page_number, page_data) is called after each page; returning False stops paging.
+    With keep_data=False pages are only handed to on_page and not collected in memory.
+    A page that fails is retried with backoff; reopen(driver) logs in again and opens the
+    grid on page 1 when the session has expired.
+    """
+    # Initialize all_data list to store data from all pages
+    all_data = []
+    retried = {}
+    page_timeout, poll = settings["page_timeout"], settings["poll_interval"]
+    
+    # Handle pagination and scrape data
+    has_more_pages = True
+    page_count = start_page
+    
+    # Read pages from the portal's postback responses, checking the first against the DOM
+    capture = None
+    if settings["capture"]:
+        from capture import start_capture
+        capture = start_capture(driver)
+    verified = False
+    
+    def scrape_current_page():
+        nonlocal capture, verified
+        page_data = capture.page_data(page_count) if capture else None
+        if page_data is None or not verified:
+            dom_data = scrape_table_data(driver, bulk=settings["bulk_extraction"])
+            if page_data is not None:
+                verified = True
+                if page_data != dom_data:
+                    print("Captured grid differs from the rendered grid, "
+                          "reading pages from the DOM for the rest of the run")
+                    capture.close()
+                    capture = None
+            page_data = dom_data
+        if not page_data:
+            raise PaginationError(f"page {page_count} returned no data")
+        return page_data
+    
+    def advance():
+        # A recovery may already have put the grid on the next page
+        indicator = read_page_indicator(driver)
+        if indicator and indicator[0] == page_count + 1:
+            return True
+        if indicator and indicator[0] != page_count:
+            raise PaginationError(f"grid is on page {indicator[0]}, expected {page_count}")
+        return go_to_next_page(driver, page_timeout, poll)
+    
+    try:
+        # Pages fetched and time spent moving between them, so the page size's effect shows
+        with span("paging", start_page=start_page, pages=0, navigation_seconds=0.0) as paging:
             while has_more_pages:
                 print(f"Processing page {page_count}")
                 
-                # Scrape current page
-                page_data = scrape_table_data(driver)
+                # Measure the bulk path against the per-cell path once per run
+                if settings["compare_extraction"] and page_count == 1:
+                    compare_extraction(driver)
                 
-                # Add headers only from the first page
-                if page_count == 1 and page_data:
-                    all_data.extend(page_data)
-                elif page_data and len(page_data) > 1:
-                    # Skip headers for subsequent pages
-                    all_data.extend(page_data[1:])
+                # Scrape current page
+                with span("scrape_page", page=page_count) as fields:
+                    page_data = retry_page(scrape_current_page, page_count, driver, settings,
+                                           reopen, retried)
+                    fields["rows"] = max(len(page_data) - 1, 0)
+                    if capture:
+                        fields["parse_seconds"] = capture.last_seconds
+                paging["pages"] += 1
+                if keep_data:
+                    merge_page_data(all_data, page_data)
+                if on_page and on_page(page_count, page_data) is False:
+                    break
                 
                 # Try to go to next page
-                has_more_pages = go_to_next_page(driver)
+                started = time.perf_counter()
+                with span("pagination", page=page_count) as fields:
+                    has_more_pages = retry_page(advance, page_count + 1, driver, settings,
+                                                reopen, retried)
+                    fields["retries"] = retried.get(page_count + 1, 0)
+                    if has_more_pages and capture:
+                        # Start parsing the new page's response before it is asked for
+                        fields["captured"] = capture.prefetch(page_count + 1)
+                paging["navigation_seconds"] += time.perf_counter() - started
                 page_count += 1
-            
-            # Create directory if it doesn't exist
-            output_dir = os.path.join(os.path.expanduser("~"), "Downloads", "WebScrapedData")
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # Generate filename with tomorrow's date
-            tomorrow_date = (datetime.now() + timedelta(days=1)).strftime("%Y%m%d")
-            excel_path = os.path.join(output_dir, f"MART_Trips_{tomorrow_date}.xlsx")
-            
-            # Save data to Excel
-            save_data_to_excel(all_data, excel_path)
+    finally:
+        if capture:
+            capture.close()
+        print(f"Fetched {paging['pages']} pages, {paging['navigation_seconds']:.2f}s "
+              f"spent moving between them")
+        if retried:
+            print("Pages that needed retries: " +
+                  ", ".join(f"{page} ({count}x)" for page, count in sorted(retried.items())))
+    
+    return all_data
+
+def driver_options(settings):
+    """The (profile, headless) arguments for setup_driver from the [driver] settings"""
+    headless = {"true": True, "yes": True, "1": True,
+                "false": False, "no": False, "0": False}.get(settings["headless"])
+    return settings["profile"], headless
+
+def log_in(driver, url, username, password, settings):
+    """Log in, reusing the cached session when session caching is on"""
+    if settings["session_cache"]:
+        from session_cache import login_with_cache
+        return login_with_cache(driver, url, username, password,
+                                ttl_minutes=settings["session_ttl_minutes"],
+                                page_timeout=settings["page_timeout"])
+    return login_to_website(driver, url, username, password, settings["page_timeout"])
+
+def scrape_with_browser(url, username, password, settings, on_page=None, start_page=1,
+                        keep_data=True):
+    """Log in with Chrome and scrape every page, returning None on failure"""
+    # Setup Chrome driver
+    with span("driver_start", profile=settings["profile"]):
+        driver = setup_driver(*driver_options(settings), capture=settings["capture"])
+    
+    try:
+        # Login to website
+        with span("login"):
+            logged_in = log_in(driver, url, username, password, settings)
+        if not logged_in:
+            print("Login failed. Exiting.")
+            return None
+        
+        # Click on red car icon from the main page (Image 2)
+        with span("navigation"):
+            on_grid = click_red_car_icon(driver, settings["page_timeout"], settings["poll_interval"],
+                                         settings["tab"], settings["max_page_size"])
+            # Skip the pages a crashed run already saved
+            skipped_to_start = on_grid and (start_page == 1 or go_to_page(
+                driver, start_page, settings["page_timeout"], settings["poll_interval"]))
+        if not on_grid:
+            print("Failed to access data through red car icon. Exiting.")
+            return None
+        if not skipped_to_start:
+            print(f"No pages left to scrape after page {start_page - 1}")
+            return []
+        
+        # Logs in again and reopens the grid if the session expires mid-run
+        def reopen(driver):
+            return open_trips_grid(driver, url, username, password, settings["page_timeout"],
+                                   settings["poll_interval"], settings["tab"],
+                                   settings["max_page_size"])
+        
+        return scrape_all_pages(driver, settings, on_page, start_page, keep_data, reopen)
+    
+    finally:
+        # Close the browser
+        print("Closing browser")
+        driver.quit()
+
+def get_output_path():
+    """Build the MART_Trips_<tomorrow>.xlsx path, creating the folder if needed"""
+    # Create directory if it doesn't exist
+    output_dir = os.path.join(os.path.expanduser("~"), "Downloads", "WebScrapedData")
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # Generate filename with tomorrow's date
+    tomorrow_date = (datetime.now() + timedelta(days=1)).strftime("%Y%m%d")
+    return os.path.join(output_dir, f"MART_Trips_{tomorrow_date}.xlsx")
+
+def service_date_test(header, service_date):
+    """Return a row -> bool test for the Date column being service_date, None without one"""
+    if "Date" not in header:
+        return None
+    column = header.index("Date")
+    
+    def on_service_date(row):
+        try:
+            return datetime.strptime(row[column].strip(), DATE_FORMAT).date() == service_date
+        except (IndexError, AttributeError, ValueError):
+            return False
+    
+    return on_service_date
+
+def keep_service_date(all_data, service_date):
+    """Drop the rows whose Date column is not service_date, keeping the header row"""
+    on_service_date = service_date_test(all_data[0], service_date) if all_data else None
+    if on_service_date is None:
+        return all_data
+    return [all_data[0]] + [row for row in all_data[1:] if on_service_date(row)]
+
+def scrape_export(url, username, password, settings, excel_path, on_page=None, service_date=None,
+                  stats=None):
+    """Scrape one portal account and save the export, returning its DataFrame or None on failure
+    
+    on_page(page_number, page_data) is also called for every page as it is scraped, and
+    service_date, when given, limits the export to that day's trips; a day without trips
+    is saved as a header-only export. stats, when given, is filled with the number of
+    trips scraped and kept.
+    """
+    results = scrape_exports(url, username, password, settings, [(excel_path, service_date)],
+                             on_page, None if stats is None else [stats])
+    return results[0] if results else None
+
+def scrape_exports(url, username, password, settings, exports, on_page=None, stats=None):
+    """Scrape the grid once and save it as one export per (excel_path, service_date) in exports
+    
+    The grid lists every day the portal shows, so jobs for several dates share one scrape
+    and each export keeps its own day's trips (all of them without a service date).
+    Returns each export's DataFrame (None where saving failed), or None when the scrape
+    failed. stats, when given, is a list with a dict per export to fill like scrape_export's.
+    The page checkpoint and incremental state of the scrape belong to the first export.
+    """
+    parallel = settings["backend"] != 'http' and settings["parallel_sessions"] > 1
+    excel_path = exports[0][0]
+    
+    # Fingerprint pages as they arrive so an unchanged day can stop paging early. Stopping
+    # early takes the later pages from the last export, so only a single export can
+    tracker = None
+    if settings["incremental"] and not parallel and len(exports) == 1:
+        from incremental import IncrementalTracker, load_state, state_path
+        tracker = IncrementalTracker(load_state(state_path(excel_path)),
+                                     settings["stop_on_unchanged_page"])
+    
+    # Write each page to disk as it is scraped so a crash resumes where it stopped
+    sink = None
+    start_page = 1
+    if settings["checkpoint"] and not parallel:
+        from sink import PageSink
+        # Page numbers depend on the page size, so only a run with the same one resumes
+        page_size = "largest" if settings["max_page_size"] else "portal default"
+        sink = PageSink(excel_path, page_size, settings["checkpoint_ttl_minutes"])
+        start_page = sink.resume_page()
+        if start_page > 1 and tracker:
+            # Page fingerprints from before the crash are gone, diff rows only
+            tracker = None
+    on_page = chain_page_callbacks(sink.on_page if sink else None,
+                                   tracker.on_page if tracker else None, on_page)
+    keep_data = sink is None
+    
+    if settings["backend"] == 'http':
+        # Replay the ASP.NET postbacks without launching a browser
+        from httpscraper import scrape_portal_http
+        all_data = scrape_portal_http(url, username, password, settings["page_timeout"],
+                                      on_page, start_page, keep_data, settings["page_retries"],
+                                      settings["backoff_seconds"], settings["tab"],
+                                      settings["max_page_size"])
+    elif parallel:
+        # Spread the pages over a pool of logged-in browser sessions
+        from parallel import scrape_pages_parallel
+        all_data = scrape_pages_parallel(url, username, password, settings)
+    else:
+        all_data = scrape_with_browser(url, username, password, settings, on_page,
+                                       start_page, keep_data)
+    if all_data is None:
+        return None
+    if sink:
+        # Assemble the export from the pages on disk
+        all_data = sink.read_all()
+    if tracker:
+        tracker.fill_remaining_pages(all_data)
+    
+    results = []
+    for index, (excel_path, service_date) in enumerate(exports):
+        export = all_data
+        if service_date and all_data:
+            scraped = len(all_data) - 1
+            export = keep_service_date(all_data, service_date)
+            kept = len(export) - 1
+            print(f"Kept {kept} of {scraped} trips on {service_date:%m/%d/%Y}")
+            if stats is not None:
+                stats[index].update(scraped=scraped, kept=kept)
+            if scraped and not kept:
+                # The grid shows the days the portal lists, which may not include this one
+                print(f"Warning: the grid had {scraped} trips but none on {service_date:%m/%d/%Y}")
+            on_service_date = service_date_test(all_data[0], service_date)
+            if tracker and on_service_date:
+                # Store the same rows the export has, or off-date trips count as removed next run
+                tracker.filter_rows(on_service_date)
+        
+        # Save data to Excel; with a service date, nothing scheduled that day is a result too
+        with span("excel_save", rows=max(len(export) - 1, 0)):
+            df = export_data(export, excel_path, allow_empty=service_date is not None)
+        
+        # Write only the added, removed and changed trips for downstream steps; a failed save
+        # keeps the previous state so its changes are reported by the next run
+        if settings["incremental"] and df is not None:
+            from incremental import record_changes
+            record_changes(excel_path, export, tracker)
+        results.append(df)
+    
+    if sink and all(df is not None for df in results):
+        sink.clear()
+    
+    # Show where locator lookups spent their time this run
+    registry.report()
+    
+    return results
+
+def run_scrape(config, excel_path=None, on_page=None):
+    """Scrape the [credentials] account and save the export, returning its DataFrame or None
+    
+    on_page(page_number, page_data) is also called for every page as it is scraped.
+    """
+    # Get credentials from config
+    url = config['credentials']['url']
+    username = config['credentials']['username']
+    password = config['credentials']['password']
+    
+    # Optional scraper settings ([scraper], [driver], [waits], [diagnostics] and [session])
+    settings = load_settings(config)
+    diagnostics.configure(capacity=settings["ring_size"], debug=settings["debug"])
+    
+    return scrape_export(url, username, password, settings, excel_path or get_output_path(), on_page)
+
+def main():
+    """Run the scraper, returning the exit code the bat files check"""
+    try:
+        # Load configuration
+        config = load_config()
+        metrics_file = metrics.start_run("webscraper")
+        
+        try:
+            df = run_scrape(config)
+            print(f"Timings written to {metrics_file}")
+            return 0 if df is not None else 1
             
         except Exception as e:
             print(f"An error occurred: {e}")
-        
-        finally:
-            # Close the browser
-            print("Closing browser")
-            driver.quit()
             
     except FileNotFoundError as e:
         print(f"Configuration error: {e}")
@@ -388,6 +898,7 @@ def main():
         print(f"Error reading configuration: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
+    return 1
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())